@@ -1,6 +1,3 @@
 cd ~/hackathon/src
-python3 run.py
 source ~/hack/bin/activate
-python3 final_sentence_wise_sentiment.py
-
-python3 relevance.py
+python3 pipeline.py
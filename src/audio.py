@@ -0,0 +1,134 @@
+import wave
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+
+# --- PCM Helpers ---
+def pcm_to_samples(pcm):
+    # View s16le bytes as int16 samples without copying
+    return np.frombuffer(pcm, dtype="<i2")
+
+def read_wav_pcm(audio_path):
+    with wave.open(audio_path, "rb") as f:
+        return f.readframes(f.getnframes())
+
+def write_wav(audio_path, pcm, sample_rate=SAMPLE_RATE):
+    with wave.open(audio_path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm)
+
+def to_pcm16k(sample_rate, samples):
+    # Microphone chunks arrive at any rate, channel count and dtype; whisper wants 16 kHz mono s16le
+    samples = np.asarray(samples)
+    if np.issubdtype(samples.dtype, np.floating):
+        samples = samples * 32767
+    elif samples.dtype.itemsize > 2:
+        samples = samples / float(1 << (8 * (samples.dtype.itemsize - 2)))
+    samples = samples.astype(np.float32)
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+    if sample_rate != SAMPLE_RATE and len(samples) > 1:
+        n_out = int(round(len(samples) * SAMPLE_RATE / sample_rate))
+        samples = np.interp(np.linspace(0, len(samples) - 1, n_out), np.arange(len(samples)), samples)
+    return np.clip(samples, -32768, 32767).astype("<i2").tobytes()
+
+def frame_energies(samples, frame_ms=FRAME_MS, sample_rate=SAMPLE_RATE):
+    # RMS energy per fixed-size frame; a trailing partial frame is dropped
+    frame_len = sample_rate * frame_ms // 1000
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return np.zeros(0)
+    frames = samples[:n_frames * frame_len].astype(np.float32).reshape(n_frames, frame_len)
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+# --- Silence-Aware Splitting ---
+def quietest_point(samples, start, end, frame_ms=FRAME_MS, sample_rate=SAMPLE_RATE):
+    # Sample index of the lowest-energy frame between start and end
+    frame_len = sample_rate * frame_ms // 1000
+    energies = frame_energies(samples[start:end], frame_ms, sample_rate)
+    if len(energies) == 0:
+        return end
+    return start + int(np.argmin(energies)) * frame_len + frame_len // 2
+
+def split_at_silence(samples, chunk_seconds=30, search_seconds=5, sample_rate=SAMPLE_RATE):
+    # Return (start, end) sample ranges of roughly chunk_seconds each, cut in pauses
+    chunk = int(chunk_seconds * sample_rate)
+    search = int(search_seconds * sample_rate)
+    bounds = []
+    start = 0
+    while len(samples) - start > chunk + search:
+        cut = quietest_point(samples, start + chunk - search, start + chunk + search, sample_rate=sample_rate)
+        bounds.append((start, cut))
+        start = cut
+    bounds.append((start, len(samples)))
+    return bounds
+
+# --- Voice Activity Detection ---
+VAD_SENSITIVITY = 0.1    # threshold position between the noise floor and speech level
+VAD_MIN_RMS = 100        # never call anything quieter than this (about -50 dBFS) speech
+VAD_MIN_SILENCE_MS = 600  # shorter pauses stay in, whisper needs them between words
+VAD_MIN_SPEECH_MS = 100   # shorter bursts (clicks, bumps) are dropped
+VAD_PAD_MS = 200          # kept on both sides of every speech region
+
+def speech_regions(samples, frame_ms=FRAME_MS, sample_rate=SAMPLE_RATE):
+    # (start, end) sample ranges that contain speech, from RMS frame energy against an adaptive threshold
+    frame_len = sample_rate * frame_ms // 1000
+    energies = frame_energies(samples, frame_ms, sample_rate)
+    if len(energies) == 0:
+        return [(0, len(samples))] if len(samples) else []
+    floor, peak = np.percentile(energies, [10, 95])
+    threshold = max(VAD_MIN_RMS, floor + VAD_SENSITIVITY * (peak - floor))
+    voiced = energies > threshold
+
+    # Runs of voiced frames as [start, end) frame indices
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    runs = edges.reshape(-1, 2)
+    regions = []
+    gap = VAD_MIN_SILENCE_MS // frame_ms
+    for start, end in runs:
+        if regions and start - regions[-1][1] < gap:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+
+    pad = VAD_PAD_MS * sample_rate // 1000
+    bounds = []
+    for start, end in regions:
+        if (end - start) * frame_ms < VAD_MIN_SPEECH_MS:
+            continue
+        start = max(0, start * frame_len - pad)
+        end = min(len(samples), end * frame_len + pad)
+        if bounds and start <= bounds[-1][1]:
+            bounds[-1] = (bounds[-1][0], end)
+        else:
+            bounds.append((start, end))
+    return bounds
+
+class OffsetMap:
+    # Maps times in speech-only audio back to the original recording
+    def __init__(self, regions, sample_rate=SAMPLE_RATE):
+        starts = np.array([start for start, _ in regions], dtype=np.int64)
+        lengths = np.array([end - start for start, end in regions], dtype=np.int64)
+        self.original_start_ms = starts * 1000 / sample_rate
+        self.trimmed_start_ms = np.concatenate(([0], np.cumsum(lengths)[:-1])) * 1000 / sample_rate
+
+    def to_original(self, ms, end=False):
+        # An end time right on a cut belongs to the region before it
+        side = "left" if end else "right"
+        i = int(np.searchsorted(self.trimmed_start_ms, ms, side=side)) - 1
+        i = min(max(i, 0), len(self.trimmed_start_ms) - 1)
+        return int(round(self.original_start_ms[i] + ms - self.trimmed_start_ms[i]))
+
+def remove_silence(samples, sample_rate=SAMPLE_RATE):
+    # (speech-only samples, OffsetMap); the map is None when less than a second was worth cutting
+    regions = speech_regions(samples, sample_rate=sample_rate)
+    if not regions:
+        return samples[:0], None
+    kept = sum(end - start for start, end in regions)
+    if len(samples) - kept < sample_rate:
+        return samples, None
+    return np.concatenate([samples[start:end] for start, end in regions]), OffsetMap(regions, sample_rate)
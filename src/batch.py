@@ -0,0 +1,273 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from cache import cache_key
+from final_sentence_wise_sentiment import transcription_to_text, analyze_segments
+from pipeline import transcribe_video, job_workspace, warm_up, StageTimer, WHISPER_MODEL_PATH
+from relevance import AsyncRelevanceEvaluator, get_evaluator, DEFAULT_MODEL, PROMPT_VERSION, MAX_IN_FLIGHT
+from relevance import warm_up as warm_up_llm
+
+VIDEO_EXTENSIONS = (".mp4", ".webm", ".mov", ".mkv", ".avi", ".m4a", ".mp3", ".wav")
+
+# --- Loading Work Items ---
+def load_items(source, question=None):
+    # source is a directory of recordings or a .csv / .jsonl manifest of (video, question) pairs
+    if os.path.isdir(source):
+        return _scan_directory(source, question)
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, "r", encoding="utf-8", newline="") as f:
+        if source.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    items = []
+    for row in rows:
+        video = os.path.join(base, row["video"])
+        items.append({"video_path": os.path.abspath(video), "question": row.get("question") or question})
+    return items
+
+def _scan_directory(root, question):
+    # A question can sit next to each recording as <name>.txt, otherwise --question is used
+    items = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in sorted(filenames):
+            stem, ext = os.path.splitext(name)
+            if ext.lower() not in VIDEO_EXTENSIONS:
+                continue
+            sidecar = os.path.join(dirpath, stem + ".txt")
+            item_question = question
+            if os.path.exists(sidecar):
+                with open(sidecar, "r", encoding="utf-8") as f:
+                    item_question = f.read().strip()
+            items.append({"video_path": os.path.abspath(os.path.join(dirpath, name)), "question": item_question})
+    items.sort(key=lambda item: item["video_path"])
+    return items
+
+def item_id(item, whisper_model, llm_model):
+    # Changing either model gives every item a new id, so a re-grade is not skipped as done
+    return cache_key(item["video_path"], item["question"], whisper_model, llm_model, PROMPT_VERSION)
+
+# --- Resumable Output ---
+def checkpoint_path(output):
+    # Parquet can't be appended to, so progress is kept in a JSONL file next to it
+    if output.endswith(".parquet"):
+        return os.path.splitext(output)[0] + ".checkpoint.jsonl"
+    return output
+
+def read_rows(path):
+    if not os.path.exists(path):
+        return []
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                pass  # last line cut off by an interrupted run
+    return rows
+
+class RowWriter:
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Start on a fresh line if the previous run died mid-write
+        torn = False
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+        self._file = open(path, "a", encoding="utf-8")
+        if torn:
+            self._file.write("\n")
+
+    def write(self, row):
+        self._file.write(json.dumps(row) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+def write_parquet(rows, output):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    # Keep the latest row per item; nested results are stored as JSON text columns
+    latest = {}
+    for row in rows:
+        latest[row["id"]] = row
+    table_rows = []
+    for row in latest.values():
+        flat = dict(row)
+        for field in ("sentiment_summary", "sentiment_timeline", "evaluation_output", "timings"):
+            flat[field] = json.dumps(row.get(field)) if row.get(field) is not None else None
+        table_rows.append(flat)
+    pq.write_table(pa.Table.from_pylist(table_rows), output)
+
+# --- Stages ---
+def _transcribe(item, whisper_model):
+    timer = StageTimer()
+    with job_workspace() as (_, workdir):
+        transcription = transcribe_video(item["video_path"], workdir, whisper_model, timer)
+    return transcription, timer.timings
+
+def _sentiment(segments):
+    timer = StageTimer()
+    analyzer = timer.run("sentiment", analyze_segments, segments)
+    return analyzer.summary(), analyzer.timeline().to_dict(), timer.timings
+
+def _make_row(item, row_id, whisper_model, llm_model):
+    return {
+        "id": row_id,
+        "video_path": item["video_path"],
+        "question": item["question"],
+        "status": "failed",
+        "error": None,
+        "answer": None,
+        "sentiment_summary": None,
+        "sentiment_timeline": None,
+        "evaluation_output": None,
+        "relevance_score": None,
+        "average_sentiment_score": None,
+        "whisper_model": os.path.basename(whisper_model),
+        "llm_model": llm_model,
+        "prompt_version": PROMPT_VERSION,
+        "timings": {},
+        "graded_at": None
+    }
+
+# --- Batch Run ---
+def run_batch(items, output, whisper_model=WHISPER_MODEL_PATH, llm_model=DEFAULT_MODEL,
+              transcribe_workers=2, sentiment_workers=2, llm_workers=MAX_IN_FLIGHT, retry_failed=True):
+    path = checkpoint_path(output)
+    previous = read_rows(path)
+    skip_status = ("done", "failed") if not retry_failed else ("done",)
+    finished = {row["id"] for row in previous if row.get("status") in skip_status}
+
+    # One entry per id: a manifest listing the same recording and question twice grades it once
+    todo = {}
+    for item in items:
+        row_id = item_id(item, whisper_model, llm_model)
+        if row_id not in finished:
+            todo.setdefault(row_id, item)
+    todo = list(todo.items())
+    print(f"[INFO] {len(items)} items, {len(todo)} to go (the rest already graded or listed twice)")
+
+    # Only the model that grades this batch is warmed and kept resident; pinning the default as well
+    # would make a one-model Ollama host swap the two back and forth all run long
+    warm_up(whisper_model, warm_llm=False)
+    loop, _ = get_evaluator()
+    evaluator = AsyncRelevanceEvaluator(model=llm_model, max_in_flight=llm_workers)
+    warm_up_llm(evaluator=evaluator)
+    transcribe_pool = ThreadPoolExecutor(max_workers=transcribe_workers, thread_name_prefix="batch-transcribe")
+    sentiment_pool = ThreadPoolExecutor(max_workers=sentiment_workers, thread_name_prefix="batch-sentiment")
+    writer = RowWriter(path)
+
+    # Each stage has its own pool; a recording moves on as soon as its previous stage is done
+    rows = {}
+    stage_of = {}
+    waiting = {}  # row_id -> stage futures still outstanding
+    graded = failed = 0
+    for row_id, item in todo:
+        row = _make_row(item, row_id, whisper_model, llm_model)
+        if not item["question"]:
+            row["error"] = "No question for this recording"
+            row["graded_at"] = time.time()
+            writer.write(row)
+            graded += 1
+            failed += 1
+            continue
+        rows[row_id] = row
+        stage_of[transcribe_pool.submit(_transcribe, item, whisper_model)] = ("transcribe", row_id)
+
+    start = time.perf_counter()
+    try:
+        while stage_of:
+            done, _ = wait(stage_of, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, row_id = stage_of.pop(future)
+                row = rows[row_id]
+                try:
+                    value = future.result()
+                except Exception as e:
+                    row["error"] = row["error"] or f"{stage}: {e}"
+                    value = None
+
+                if stage == "transcribe" and value is not None:
+                    transcription, timings = value
+                    answer = transcription_to_text(transcription).strip()
+                    row["answer"] = answer
+                    row["timings"].update(timings)
+                    sentiment = sentiment_pool.submit(_sentiment, transcription["transcription"])
+                    relevance = asyncio.run_coroutine_threadsafe(evaluator.score(row["question"], answer), loop)
+                    stage_of[sentiment] = ("sentiment", row_id)
+                    stage_of[relevance] = ("relevance", row_id)
+                    waiting[row_id] = 2
+                    continue
+                if stage == "sentiment" and value is not None:
+                    summary, timeline, timings = value
+                    row["sentiment_summary"] = summary
+                    row["sentiment_timeline"] = timeline
+                    row["timings"].update(timings)
+                    if summary:
+                        row["average_sentiment_score"] = summary["average_sentiment_score"]
+                elif stage == "relevance" and value is not None:
+                    row["evaluation_output"] = value
+                    row["relevance_score"] = value.get("score")
+
+                if stage != "transcribe":
+                    waiting[row_id] -= 1
+                    if waiting[row_id]:
+                        continue
+                    del waiting[row_id]
+
+                if row["error"] is None and row["evaluation_output"] and row["evaluation_output"]["observation"].startswith("Error:"):
+                    row["error"] = f"relevance: {row['evaluation_output']['observation']}"
+                row["status"] = "failed" if row["error"] else "done"
+                row["graded_at"] = time.time()
+                writer.write(row)
+                del rows[row_id]
+                graded += 1
+                failed += row["status"] == "failed"
+                if graded % 10 == 0 or graded == len(todo):
+                    rate = graded / (time.perf_counter() - start)
+                    print(f"[INFO] {graded}/{len(todo)} graded ({failed} failed, {rate:.2f} items/s)")
+    finally:
+        writer.close()
+        transcribe_pool.shutdown(wait=False, cancel_futures=True)
+        sentiment_pool.shutdown(wait=False, cancel_futures=True)
+
+    if output.endswith(".parquet"):
+        write_parquet(read_rows(path), output)
+        print(f"[INFO] Wrote {output}")
+    return graded, failed
+
+# === Main ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grade a directory or manifest of recorded answers")
+    parser.add_argument("source", help="directory of recordings, or a .csv / .jsonl manifest with video,question")
+    parser.add_argument("-o", "--output", default="grades.jsonl", help="results file (.jsonl or .parquet)")
+    parser.add_argument("-q", "--question", help="question for recordings without one in the manifest or a .txt sidecar")
+    parser.add_argument("--whisper-model", default=WHISPER_MODEL_PATH)
+    parser.add_argument("--llm-model", default=DEFAULT_MODEL)
+    parser.add_argument("--transcribe-workers", type=int, default=2, help="recordings transcribed at once")
+    parser.add_argument("--sentiment-workers", type=int, default=2, help="threads scoring sentiment")
+    parser.add_argument("--llm-workers", type=int, default=MAX_IN_FLIGHT, help="LLM requests in flight")
+    parser.add_argument("--skip-failed", action="store_true", help="don't retry items that failed in an earlier run")
+    args = parser.parse_args()
+
+    if args.output.endswith(".parquet"):
+        import pyarrow  # fail now rather than after grading everything
+
+    items = load_items(args.source, args.question)
+    graded, failed = run_batch(
+        items, args.output,
+        whisper_model=args.whisper_model, llm_model=args.llm_model,
+        transcribe_workers=args.transcribe_workers, sentiment_workers=args.sentiment_workers,
+        llm_workers=args.llm_workers, retry_failed=not args.skip_failed
+    )
+    print(f"[INFO] Done: {graded} graded, {failed} failed")
@@ -0,0 +1,304 @@
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Synthetic answers of increasing length, in seconds of speech
+LENGTHS = (15, 60, 240)
+WORDS_PER_SECOND = 2.5
+REPEATS = 5
+BASELINE_PATH = "benchmark_baseline.json"
+RESULTS_PATH = "benchmark_results.json"
+QUESTION = "Tell me about a time you disagreed with your boss."
+
+SENTENCES = [
+    "I disagreed with my manager about the release date for our payments service.",
+    "I was worried that shipping early would hurt our customers and damage the team's reputation.",
+    "So I gathered data from the last three incidents and shared it with her in a calm one on one.",
+    "She was frustrated at first, which was understandable given the pressure from sales.",
+    "We agreed on a smaller launch with the risky features behind a flag.",
+    "The launch went smoothly and we avoided a painful outage.",
+    "Honestly it was a tough conversation, but it made our working relationship much stronger.",
+    "I learned that bringing evidence and proposing options works far better than simply saying no."
+]
+
+# --- Synthetic Inputs ---
+def synthetic_answer(seconds):
+    words = int(seconds * WORDS_PER_SECOND)
+    sentences = []
+    count = 0
+    while count < words:
+        sentence = SENTENCES[len(sentences) % len(SENTENCES)]
+        sentences.append(sentence)
+        count += len(sentence.split())
+    return " ".join(sentences)
+
+def synthetic_wav(path, seconds):
+    # Speech-like bursts of tone with short pauses, so silence splitting has something to find
+    import audio
+    t = np.arange(int(seconds * audio.SAMPLE_RATE)) / audio.SAMPLE_RATE
+    envelope = (np.sin(2 * np.pi * t / 2.0) > -0.6).astype(np.float32)
+    samples = 0.3 * np.sin(2 * np.pi * 180 * t) * envelope
+    audio.write_wav(path, (samples * 32767).astype("<i2").tobytes())
+    return path
+
+def synthetic_video(path, seconds):
+    import subprocess
+    subprocess.run([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"sine=frequency=180:duration={seconds}",
+        "-f", "lavfi", "-i", f"color=c=black:s=320x240:r=10:d={seconds}",
+        "-shortest", "-c:v", "mpeg4", "-c:a", "aac", path
+    ], check=True)
+    return path
+
+def synthetic_sentiment(seconds):
+    from final_sentence_wise_sentiment import analyze_sentences_period_only
+    return analyze_sentences_period_only(synthetic_answer(seconds))
+
+# --- Stub LLM ---
+class _StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.latency)
+        body = json.dumps({
+            "model": request.get("model", ""),
+            "created_at": "2025-04-20T00:00:00Z",
+            "message": {"role": "assistant", "content": "Score: 82\n\nExplanation: The answer addresses the question with a concrete example."},
+            "done": True,
+            "done_reason": "stop",
+            "prompt_eval_count": len(json.dumps(request.get("messages", []))) // 4,
+            "eval_count": 20
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_stub_llm(latency=0.0):
+    # Answers /api/chat like Ollama would; children reach it through OLLAMA_HOST
+    handler = type("StubOllamaHandler", (_StubOllamaHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True).start()
+    os.environ["OLLAMA_HOST"] = f"127.0.0.1:{server.server_address[1]}"
+    return server
+
+# --- Stages ---
+def _setup_extract(seconds, tmp):
+    return (synthetic_video(os.path.join(tmp, "input.mp4"), seconds), os.path.join(tmp, "output.wav"))
+
+def _setup_transcribe(seconds, tmp):
+    from pipeline import WHISPER_MODEL_PATH
+    return (synthetic_wav(os.path.join(tmp, "input.wav"), seconds), WHISPER_MODEL_PATH, os.path.join(tmp, "whisper_transcription.json"))
+
+def _setup_sentiment(seconds, tmp):
+    return (synthetic_answer(seconds),)
+
+def _setup_plot(seconds, tmp):
+    return (synthetic_sentiment(seconds), os.path.join(tmp, "sentiment_summary.json"), os.path.join(tmp, "sentiment_plot.png"))
+
+def _setup_llm(seconds, tmp):
+    return (QUESTION, synthetic_answer(seconds))
+
+def _setup_report(seconds, tmp):
+    # Same arguments dummy_submit passes for an 82/100 answer
+    from final_sentence_wise_sentiment import summarize
+    summary = summarize(synthetic_sentiment(seconds))
+    sentiment = max(0, round(summary["average_sentiment_score"] / 10))
+    return (sentiment, 8, "Explanation: on topic.", "Clear and warm delivery.", summary)
+
+def _call_extract(video_path, audio_path):
+    from run import extract_audio_with_ffmpeg
+    return extract_audio_with_ffmpeg(video_path, audio_path)
+
+def _call_transcribe(audio_path, model_path, output_json):
+    from run import transcribe_with_whisper_cpp
+    return transcribe_with_whisper_cpp(audio_path, model_path, output_json)
+
+def _call_sentiment(text):
+    from final_sentence_wise_sentiment import analyze_sentences_period_only
+    return analyze_sentences_period_only(text)
+
+def _call_plot(results, summary_path, plot_path):
+    from final_sentence_wise_sentiment import summarize_and_plot
+    return summarize_and_plot(results, summary_path, plot_path)
+
+def _call_llm(question, answer):
+    from relevance import evaluate_answer
+    reply = evaluate_answer(question, answer)
+    if reply.startswith("Error:"):
+        raise RuntimeError(reply)
+    return reply
+
+def _call_report(*args):
+    # Cold render every time; the memoized path is what this benchmark is meant to compare against.
+    # Calls report directly: importing frontend would build the whole Gradio app inside the timed process
+    import report
+    for renderer in (report.render_score_chart, report.render_wordcloud, report.render_score_table, report.render_word_table):
+        renderer.cache_clear()
+    return report.render_report(*args)
+
+def _whisper_missing():
+    from pipeline import WHISPER_MODEL_PATH
+    from run import WHISPER_CLI_BIN, can_stream_audio
+    if not os.path.exists(WHISPER_MODEL_PATH):
+        return f"no model at {WHISPER_MODEL_PATH}"
+    if not (can_stream_audio() or os.path.exists(WHISPER_CLI_BIN)):
+        return "whisper.cpp is not built"
+    return None
+
+STAGES = {
+    # name: (setup, call, reason the stage can't run here or None)
+    "extract_audio_with_ffmpeg": (_setup_extract, _call_extract, lambda: None if shutil.which("ffmpeg") else "ffmpeg not found"),
+    "transcribe_with_whisper_cpp": (_setup_transcribe, _call_transcribe, _whisper_missing),
+    "analyze_sentences_period_only": (_setup_sentiment, _call_sentiment, lambda: None),
+    "summarize_and_plot": (_setup_plot, _call_plot, lambda: None),
+    "evaluate_answer": (_setup_llm, _call_llm, lambda: None),
+    "render_report": (_setup_report, _call_report, lambda: None if importlib.util.find_spec("wordcloud") else "wordcloud not installed")
+}
+
+# --- Measurement ---
+def _bench_stage(name, seconds, repeats):
+    # Runs in a fresh process, so ru_maxrss is this stage's own peak
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    setup, call, _ = STAGES[name]
+    with tempfile.TemporaryDirectory() as tmp:
+        args = setup(seconds, tmp)
+        call(*args)  # imports, model loads and lexicon warm-up stay out of the numbers
+
+        latencies = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            call(*args)
+            latencies.append(time.perf_counter() - start)
+
+        # Separate pass: tracemalloc slows allocation-heavy code down
+        tracemalloc.start()
+        call(*args)
+        _, heap_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "latencies": latencies,
+        "heap_peak_mb": heap_peak / (1 << 20),
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+def summarize_latencies(seconds, measured):
+    latencies = np.array(measured["latencies"])
+    p50 = float(np.percentile(latencies, 50))
+    return {
+        "p50_s": round(p50, 5),
+        "p95_s": round(float(np.percentile(latencies, 95)), 5),
+        "runs": len(latencies),
+        "throughput_per_s": round(len(latencies) / float(latencies.sum()), 3),
+        "audio_seconds_per_s": round(seconds / p50, 2) if p50 else None,
+        "heap_peak_mb": round(measured["heap_peak_mb"], 2),
+        "max_rss_mb": round(measured["max_rss_mb"], 1)
+    }
+
+def run_benchmarks(stages, lengths=LENGTHS, repeats=REPEATS, llm_latency=0.0):
+    stub = start_stub_llm(llm_latency)
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    try:
+        for name in stages:
+            skip = STAGES[name][2]()
+            if skip:
+                print(f"[INFO] Skipping {name}: {skip}")
+                results[name] = {"skipped": skip}
+                continue
+            results[name] = {}
+            for seconds in lengths:
+                with ctx.Pool(1) as pool:
+                    try:
+                        measured = pool.apply(_bench_stage, (name, seconds, repeats))
+                    except Exception as e:
+                        print(f"[ERROR] {name} @ {seconds}s: {e}")
+                        results[name][str(seconds)] = {"error": str(e)}
+                        continue
+                row = summarize_latencies(seconds, measured)
+                results[name][str(seconds)] = row
+                print(f"[INFO] {name:<30} {seconds:>4}s  p50 {row['p50_s']:.4f}s  p95 {row['p95_s']:.4f}s  "
+                      f"{row['throughput_per_s']:.2f}/s  rss {row['max_rss_mb']:.0f} MB  heap {row['heap_peak_mb']:.1f} MB")
+    finally:
+        stub.shutdown()
+    return results
+
+# --- Baseline Comparison ---
+def compare(results, baseline, tolerance):
+    # Returns the (stage, length, change) rows whose p50 got slower by more than tolerance
+    regressions = []
+    for name, by_length in results.items():
+        for seconds, row in by_length.items():
+            if not isinstance(row, dict) or "p50_s" not in row:
+                continue
+            old = baseline.get("results", {}).get(name, {}).get(seconds, {})
+            if not old.get("p50_s"):
+                continue
+            change = row["p50_s"] / old["p50_s"] - 1
+            marker = "REGRESSION" if change > tolerance else "ok"
+            print(f"[INFO] {name:<30} {seconds:>4}s  p50 {old['p50_s']:.4f}s -> {row['p50_s']:.4f}s ({change:+.0%}) {marker}")
+            if change > tolerance:
+                regressions.append((name, seconds, change))
+    return regressions
+
+# === Main ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage latency, throughput and memory of the grading pipeline")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--lengths", nargs="+", type=int, default=list(LENGTHS), help="answer lengths in seconds")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds the stub LLM waits before replying")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown before a stage counts as regressed")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeats": args.repeats,
+            "llm_latency": args.llm_latency
+        },
+        "results": run_benchmarks(args.stages, args.lengths, args.repeats, args.llm_latency)
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"[INFO] Results saved to {args.output}")
+
+    regressions = []
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"[INFO] Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results["results"], json.load(f), args.tolerance)
+    sys.exit(1 if regressions else 0)
@@ -1,22 +1,154 @@
+import bisect
 import json
-import matplotlib.pyplot as plt
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-from collections import Counter
+import string
+import threading
+import numpy as np
+from collections import Counter, OrderedDict
 
-# Initialize VADER sentiment analyzer
-analyzer = SentimentIntensityAnalyzer()
+import metrics
+
+# VADER sentiment analyzer, loaded on first use (reading the lexicon is not free)
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+def get_analyzer():
+    global _analyzer
+    with _analyzer_lock:
+        if _analyzer is None:
+            from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+            _analyzer = SentimentIntensityAnalyzer()
+        return _analyzer
+
+def warm_up():
+    # Load the lexicon and fill the word cache ahead of the first request
+    get_analyzer()
+    word_cache.preload_lexicon()
+
+def transcription_to_text(data):
+    return " ".join([chunk["text"] for chunk in data["transcription"]])
 
 def load_whisper_text(file_path):
     with open(file_path, 'r') as f:
         data = json.load(f)
-    return " ".join([chunk["text"] for chunk in data["transcription"]])
+    return transcription_to_text(data)
 
-def get_word_contributions(sentence):
-    words = sentence.split()
-    word_scores = []
+def load_whisper_segments(file_path):
+    with open(file_path, 'r') as f:
+        return json.load(f)["transcription"]
+
+# --- Batched Word Scoring ---
+def _word_valence(word, lexicon, boosters):
+    # Lexicon valence VADER gives a lone token (same punctuation stripping and booster rule)
+    item = word.strip(string.punctuation)
+    if len(item) <= 2:
+        item = word
+    item = item.lower()
+    if item in boosters:
+        return 0.0
+    return lexicon.get(item, 0.0)
 
+def _punctuation_emphasis(word):
+    ep_amplifier = min(word.count("!"), 4) * 0.292
+    qm_count = word.count("?")
+    qm_amplifier = 0
+    if qm_count > 1:
+        qm_amplifier = qm_count * 0.18 if qm_count <= 3 else 0.96
+    return ep_amplifier + qm_amplifier
+
+def _compute_scores(words):
+    # Same values as analyzer.polarity_scores(word)['compound'], computed in bulk for unique tokens
+    from vaderSentiment.vaderSentiment import BOOSTER_DICT
+    analyzer = get_analyzer()
+    scores = {}
+    plain = []
     for word in words:
-        score = analyzer.polarity_scores(word)['compound']
+        if any(ch in analyzer.emojis for ch in word):
+            # Emojis expand into several words, leave those to VADER itself
+            scores[word] = analyzer.polarity_scores(word)['compound']
+        else:
+            plain.append(word)
+
+    valence = np.fromiter((_word_valence(w, analyzer.lexicon, BOOSTER_DICT) for w in plain), dtype=float, count=len(plain))
+    emphasis = np.fromiter((_punctuation_emphasis(w) for w in plain), dtype=float, count=len(plain))
+    total = valence + np.sign(valence) * emphasis
+    compound = np.clip(total / np.sqrt(total * total + 15), -1.0, 1.0)
+    for word, value in zip(plain, compound.tolist()):
+        scores[word] = round(value, 4)
+    return scores
+
+# --- Process-Wide Word Score Cache ---
+class WordScoreCache:
+    def __init__(self, maxsize=50000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, words):
+        # Split unique words into cached scores and the ones still to compute
+        found = {}
+        missing = []
+        with self._lock:
+            for word in words:
+                score = self._scores.get(word)
+                if score is None:
+                    missing.append(word)
+                else:
+                    self._scores.move_to_end(word)
+                    found[word] = score
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def store(self, scores):
+        with self._lock:
+            self._scores.update(scores)
+            for word in scores:
+                self._scores.move_to_end(word)
+            while len(self._scores) > self.maxsize:
+                self._scores.popitem(last=False)
+
+    def preload_lexicon(self):
+        # Warm the cache with every plain lexicon word, up to maxsize. Multi-word entries ("can't stand")
+        # are skipped: split() tokens never look them up and their batched score isn't VADER's
+        words = [word for word in get_analyzer().lexicon if not any(c.isspace() for c in word)][:self.maxsize]
+        self.store(_compute_scores(words))
+        print(f"[INFO] Preloaded {len(words)} lexicon words into the word score cache")
+
+    def clear(self):
+        with self._lock:
+            self._scores.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._scores),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+word_cache = WordScoreCache()
+metrics.register_cache("word_scores", word_cache.stats)
+
+def score_words(words):
+    # Compound score for every token; repeated vocabulary is served from word_cache
+    scores, missing = word_cache.lookup(dict.fromkeys(words))
+    if missing:
+        computed = _compute_scores(missing)
+        word_cache.store(computed)
+        scores.update(computed)
+    return np.array([scores[w] for w in words], dtype=float)
+
+def _contributions(words, scores):
+    word_scores = []
+
+    for word, score in zip(words, scores):
         if score >= 0.1 or score <= -0.1:
             word_scores.append({
                 "word": word,
@@ -26,14 +158,41 @@ def get_word_contributions(sentence):
 
     return word_scores
 
-def analyze_sentences_period_only(text):
+def get_word_contributions(sentence):
+    words = sentence.split()
+    return _contributions(words, score_words(words).tolist())
+
+def split_sentences(text):
     # Ultra-strict: only split on periods
-    sentences = [s.strip() for s in text.split('.') if s.strip()]
+    return [s.strip() + "." for s in text.split('.') if s.strip()]  # Add the period back
+
+def sentence_spans(text):
+    # split_sentences plus (start, end) character positions of each sentence in text
+    spans = []
+    pos = 0
+    for piece in text.split('.'):
+        stripped = piece.strip()
+        if stripped:
+            start = pos + len(piece) - len(piece.lstrip())
+            period = pos + len(piece)
+            end = period + 1 if period < len(text) else pos + len(piece.rstrip())
+            spans.append((stripped + ".", start, end))
+        pos += len(piece) + 1
+    return spans
+
+def score_sentences(sentences, first_number=1):
     results = []
 
+    # Tokenize once and score every word of the transcript in a single batch
+    sentence_words = [sentence.split() for sentence in sentences]
+    word_scores = score_words([w for words in sentence_words for w in words]).tolist()
+    pos = 0
+
     for i, sentence in enumerate(sentences):
-        sentence += "."  # Add the period back
-        sentiment = analyzer.polarity_scores(sentence)
+        words = sentence_words[i]
+        scores = word_scores[pos:pos + len(words)]
+        pos += len(words)
+        sentiment = get_analyzer().polarity_scores(sentence)
         compound = sentiment["compound"]
 
         if compound >= 0.05:
@@ -43,10 +202,10 @@ def analyze_sentences_period_only(text):
         else:
             label = "Neutral"
 
-        word_contributions = get_word_contributions(sentence)
+        word_contributions = _contributions(words, scores)
 
         results.append({
-            "sentence_number": i + 1,
+            "sentence_number": first_number + i,
             "text": sentence,
             "sentiment_score": round(compound * 100, 2),
             "sentiment_label": label,
@@ -55,13 +214,16 @@ def analyze_sentences_period_only(text):
 
     return results
 
+@metrics.timed("sentiment")
+def analyze_sentences_period_only(text):
+    return score_sentences(split_sentences(text))
+
 def save_results(results, output_path="sentiment_results.json"):
     with open(output_path, "w") as f:
         json.dump(results, f, indent=4)
     print(f"✅ Saved detailed sentiment analysis to {output_path}")
 
-def summarize_and_plot(results):
-    sentence_nums = [r["sentence_number"] for r in results]
+def summarize(results):
     scores = [r["sentiment_score"] for r in results]
     labels = [r["sentiment_label"] for r in results]
 
@@ -108,12 +270,178 @@ def summarize_and_plot(results):
         },
         "insight": f"Sentence {worst_sent['sentence_number']} made the sentiment score lower, while Sentence {best_sent['sentence_number']} had the most positive tone overall."
     }
+    return summary
+
+# --- Incremental Analysis ---
+class IncrementalSentimentAnalyzer:
+    # Takes transcript text as it arrives and scores each sentence once, when its period shows up.
+    # summary() matches summarize() over the same sentences without revisiting earlier ones.
+    def __init__(self):
+        self.results = []
+        self._tail = ""  # text after the last completed sentence
+        self._pieces = []  # (offset in tail, length, start_ms, end_ms) of each timed segment in the tail
+        self._score_sum = 0.0
+        self._labels = Counter()
+        self._pos_words = Counter()
+        self._neg_words = Counter()
+        self._best = None
+        self._worst = None
+
+    def add_text(self, text, start_ms=None, end_ms=None):
+        # Returns the results for sentences this text completed; with a time range,
+        # each sentence also gets start_ms / end_ms
+        offset = len(self._tail) + 1 if self._tail else 0
+        self._tail = f"{self._tail} {text}" if self._tail else text
+        if start_ms is not None and text:
+            self._pieces.append((offset, len(text), start_ms, end_ms))
+        end = self._tail.rfind(".")
+        if end == -1:
+            return []
+        complete, self._tail = self._tail[:end + 1], self._tail[end + 1:]
+        new = self._score(complete)
+        cut = end + 1
+        self._pieces = [(o - cut, n, a, b) for o, n, a, b in self._pieces if o + n > cut]
+        return new
+
+    def add_segments(self, segments):
+        # whisper segments, timed by their "offsets" when they have them
+        new = []
+        for segment in segments:
+            offsets = segment.get("offsets")
+            if offsets:
+                new.extend(self.add_text(segment["text"], offsets["from"], offsets["to"]))
+            else:
+                new.extend(self.add_text(segment["text"]))
+        return new
+
+    def flush(self):
+        # Score whatever is left without a closing period (end of the answer)
+        tail, self._tail = self._tail, ""
+        new = self._score(tail) if tail.strip() else []
+        self._pieces = []
+        return new
+
+    def _time_at(self, pos):
+        # Millisecond time of a tail character, interpolated within the segment it came from
+        if not self._pieces:
+            return None
+        i = bisect.bisect_right(self._pieces, pos, key=lambda piece: piece[0]) - 1
+        offset, length, start_ms, end_ms = self._pieces[max(i, 0)]
+        fraction = min(max((pos - offset) / length, 0.0), 1.0)
+        return int(round(start_ms + (end_ms - start_ms) * fraction))
+
+    def _score(self, text):
+        spans = sentence_spans(text)
+        new = score_sentences([sentence for sentence, _, _ in spans], first_number=len(self.results) + 1)
+        if self._pieces:
+            for r, (_, start, end) in zip(new, spans):
+                r["start_ms"] = self._time_at(start)
+                r["end_ms"] = self._time_at(end)
+        for r in new:
+            self._score_sum += r["sentiment_score"]
+            self._labels[r["sentiment_label"]] += 1
+            for word_info in r["contributing_words"]:
+                if word_info["sentiment_label"] == "Positive":
+                    self._pos_words[word_info["word"]] += 1
+                elif word_info["sentiment_label"] == "Negative":
+                    self._neg_words[word_info["word"]] += 1
+            # Strict comparisons keep the first sentence on ties, like max()/min()
+            if self._best is None or r["sentiment_score"] > self._best["sentiment_score"]:
+                self._best = r
+            if self._worst is None or r["sentiment_score"] < self._worst["sentiment_score"]:
+                self._worst = r
+        self.results.extend(new)
+        return new
+
+    def summary(self):
+        # Same shape and values as summarize(self.results); None before the first sentence
+        total = len(self.results)
+        if not total:
+            return None
+        positive = self._labels["Positive"]
+        best_sent, worst_sent = self._best, self._worst
+        return {
+            "average_sentiment_score": round(self._score_sum / total, 2),
+            "positive_sentences": positive,
+            "neutral_sentences": self._labels["Neutral"],
+            "negative_sentences": self._labels["Negative"],
+            "total_sentences": total,
+            "positivity_percentage": round((positive / total) * 100, 2),
+            "top_positive_contributing_words": [{"word": w, "count": c} for w, c in self._pos_words.most_common(5)],
+            "top_negative_contributing_words": [{"word": w, "count": c} for w, c in self._neg_words.most_common(5)],
+            "best_sentence": {
+                "sentence_number": best_sent["sentence_number"],
+                "text": best_sent["text"],
+                "score": best_sent["sentiment_score"]
+            },
+            "worst_sentence": {
+                "sentence_number": worst_sent["sentence_number"],
+                "text": worst_sent["text"],
+                "score": worst_sent["sentiment_score"]
+            },
+            "insight": f"Sentence {worst_sent['sentence_number']} made the sentiment score lower, while Sentence {best_sent['sentence_number']} had the most positive tone overall."
+        }
+
+    def timeline(self):
+        return SentimentTimeline.from_results(self.results)
+
+@metrics.timed("sentiment")
+def analyze_segments(segments):
+    # Sentiment straight from whisper segments: no transcript-wide join and re-split,
+    # and every sentence keeps its start_ms / end_ms
+    analyzer = IncrementalSentimentAnalyzer()
+    analyzer.add_segments(segments)
+    analyzer.flush()
+    return analyzer
+
+# --- Time-Aligned Sentiment Track ---
+class SentimentTimeline:
+    # Parallel arrays, one entry per sentence in time order
+    def __init__(self, start_ms, end_ms, score):
+        self.start_ms = np.asarray(start_ms, dtype=np.int64)
+        self.end_ms = np.asarray(end_ms, dtype=np.int64)
+        self.score = np.asarray(score, dtype=np.float32)
+
+    @classmethod
+    def from_results(cls, results):
+        timed = [r for r in results if r.get("start_ms") is not None]
+        return cls([r["start_ms"] for r in timed], [r["end_ms"] for r in timed], [r["sentiment_score"] for r in timed])
+
+    def __len__(self):
+        return len(self.start_ms)
+
+    def at(self, ms):
+        # Index of the sentence being spoken at ms, or None in a gap
+        i = int(np.searchsorted(self.start_ms, ms, side="right")) - 1
+        if i >= 0 and ms <= self.end_ms[i]:
+            return i
+        return None
+
+    def between(self, start_ms, end_ms):
+        # Slice of the sentences that overlap [start_ms, end_ms]
+        lo = int(np.searchsorted(self.end_ms, start_ms, side="left"))
+        hi = int(np.searchsorted(self.start_ms, end_ms, side="right"))
+        return slice(lo, max(lo, hi))
+
+    def mean_score(self, start_ms, end_ms):
+        window = self.score[self.between(start_ms, end_ms)]
+        return float(window.mean()) if len(window) else None
+
+    def to_dict(self):
+        return {"start_ms": self.start_ms.tolist(), "end_ms": self.end_ms.tolist(), "score": [round(s, 2) for s in self.score.tolist()]}
+
+@metrics.timed("render")
+def summarize_and_plot(results, summary_path="sentiment_summary.json", plot_path="sentiment_plot.png"):
+    summary = summarize(results)
+    sentence_nums = [r["sentence_number"] for r in results]
+    scores = [r["sentiment_score"] for r in results]
 
-    with open("sentiment_summary.json", "w") as f:
+    with open(summary_path, "w") as f:
         json.dump(summary, f, indent=4)
-    print("✅ Summary saved to sentiment_summary.json")
+    print(f"✅ Summary saved to {summary_path}")
 
     # Plot sentiment over time
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(10, 5))
     plt.plot(sentence_nums, scores, marker='o', linewidth=2)
     plt.title("Sentence-Level Sentiment Over Time (Strict Split)")
@@ -121,12 +449,13 @@ def summarize_and_plot(results):
     plt.ylabel("Sentiment Score (Compound x 100)")
     plt.grid(True)
     plt.tight_layout()
-    plt.savefig("sentiment_plot.png")
+    plt.savefig(plot_path)
     plt.close()
-    print("✅ Sentiment plot saved as sentiment_plot.png")
+    print(f"✅ Sentiment plot saved as {plot_path}")
+    return summary
 
 if __name__ == "__main__":
-    text = load_whisper_text("whisper_transcription.json")  # Your input JSON
-    results = analyze_sentences_period_only(text)
+    segments = load_whisper_segments("whisper_transcription.json")  # Your input JSON
+    results = analyze_segments(segments).results
     save_results(results)
     summarize_and_plot(results)
@@ -1,28 +1,24 @@
 import gradio as gr
-import matplotlib.pyplot as plt
-import numpy as np
-from wordcloud import WordCloud
+import importlib
+import math
 import random
-import shutil
-import pandas as pd
-import json
-import os
-import io
-import base64
+import threading
 import time
-import subprocess
 
-# Function to load JSON files
-def load_json_file(file_path):
-    try:
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"File {file_path} not found. Please ensure it exists.")
-        with open(file_path, 'r') as file:
-            return json.load(file)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Error decoding {file_path}: {str(e)}")
-    except Exception as e:
-        raise Exception(f"Error loading {file_path}: {str(e)}")
+from jobs import JobQueue
+import live
+import metrics
+import pipeline
+import report
+
+# Submissions are graded by a background worker pool, each in its own workspace
+job_queue = JobQueue()
+
+def warm_up():
+    # Heavy modules load off the startup path; a request that needs one first just waits on the import lock
+    pipeline.warm_up()
+    for module in ("matplotlib.figure", "pandas", "wordcloud", "ollama"):
+        importlib.import_module(module)
 
 # === Practice Questions ===
 questions_practice_mode = [
@@ -52,20 +48,7 @@ interview_questions_list = [
 def get_random_question():
     return random.choice(questions_practice_mode)
 
-def dummy_submit(video, question):
-    # Construct absolute paths to JSON files
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    sentiment_file = os.path.join(script_dir, "sentiment_summary.json")
-    relevance_file = os.path.join(script_dir, "evaluation_output.json")
-
-    # Load sentiment and relevance data
-    try:
-        sentiment_data = load_json_file(sentiment_file)
-        relevance_data = load_json_file(relevance_file)
-    except Exception as e:
-        print(f"Error: {str(e)}")
-        exit(1)
-
+def dummy_submit(video, question, sentiment_data, relevance_data):
     # Extract data from JSON
     sentiment = round(sentiment_data.get("average_sentiment_score", 0) / 10)  # Scale to 0-10
     if sentiment < 0:
@@ -111,34 +94,10 @@ def dummy_submit(video, question):
         1: "Unrelated answer — make sure to listen/read carefully."
     }.get(relevance, "Relevance feedback unavailable.")
 
-    # Create pie chart visualization with black background and white text
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(8, 4), facecolor='black')
-    fig.patch.set_facecolor('black')
-
-    # Sentiment pie chart
-    ax1.pie([sentiment, 10 - sentiment], labels=[f"{sentiment}/10", "Missed"],
-            colors=['#f497a9', '#f2f2f2'], startangle=90, autopct='%1.0f%%',
-            shadow=True, explode=[0.05, 0], textprops={'fontsize': 9, 'color': 'white'})
-    ax1.set_title("Sentiment Score", fontsize=12, color='white')
-    ax1.set_facecolor('black')
-
-    # Relevance pie chart
-    ax2.pie([relevance, 10 - relevance], labels=[f"{relevance}/10", "Missed"],
-            colors=['#72d6c9', '#eeeeee'], startangle=90, autopct='%1.0f%%',
-            shadow=True, explode=[0.05, 0], textprops={'fontsize': 9, 'color': 'white'})
-    ax2.set_title("Relevance Score", fontsize=12, color='white')
-    ax2.set_facecolor('black')
-
-    plt.suptitle("Score Breakdown", fontsize=13, color='white')
-    plt.tight_layout()
-
-    # Create score table
-    score_table_data = [
-        {"Metric": "Relevance Score", "Value": f"{relevance}/10", "Feedback": relevance_feedback},
-        {"Metric": "Sentiment Score", "Value": f"{sentiment}/10", "Feedback": sentiment_feedback}
-    ]
-    score_table_df = pd.DataFrame(score_table_data)
-    score_table_html = score_table_df.to_html(index=False, classes="score-table", justify="left")
+    # Charts, tables and wordcloud are memoized and rendered off the request thread
+    chart_html, score_table_html, word_table_html, wordcloud_html = report.render_report(
+        sentiment, relevance, relevance_feedback, sentiment_feedback, sentiment_data
+    )
 
     # Create insights text
     insights = (
@@ -147,153 +106,168 @@ def dummy_submit(video, question):
         # f"<b>Sentiment Insight:</b> {sentiment_data.get('insight', 'No insight available.')}"
     )
 
-    # Create word table without row coloring
-    pos_df = pd.DataFrame(sentiment_data.get("top_positive_contributing_words", []))
-    neg_df = pd.DataFrame(sentiment_data.get("top_negative_contributing_words", []))
-    pos_df["Type"] = "Positive"
-    neg_df["Type"] = "Negative"
-    combined_df = pd.concat([pos_df, neg_df], ignore_index=True)[["Type", "word", "count"]]
-    word_table_html = combined_df.to_html(index=False, classes="word-table", justify="center")
-
-    # Create word cloud with separate colors for positive (greenish) and negative (reddish) words
-    pos_words = {item["word"]: item["count"] for item in sentiment_data.get("top_positive_contributing_words", [])}
-    neg_words = {item["word"]: item["count"] for item in sentiment_data.get("top_negative_contributing_words", [])}
-    wordcloud_html = ""
-    if pos_words or neg_words:
-        # Create a figure with increased size (1.5x: 400x200 -> 600x300)
-        plt.figure(figsize=(6, 3), facecolor='black')
-        
-        # Generate positive word cloud (greenish shades)
-        if pos_words:
-            wordcloud_pos = WordCloud(
-                width=600, height=300,
-                background_color=None,  # Transparent background for overlay
-                mode="RGBA",
-                min_font_size=8, max_font_size=40,
-                colormap='Greens'  # Greenish shades
-            ).generate_from_frequencies(pos_words)
-            plt.imshow(wordcloud_pos, interpolation='bilinear')
-        
-        # Generate negative word cloud (reddish shades) and overlay
-        if neg_words:
-            wordcloud_neg = WordCloud(
-                width=600, height=300,
-                background_color=None,  # Transparent background for overlay
-                mode="RGBA",
-                min_font_size=8, max_font_size=40,
-                colormap='Reds'  # Reddish shades
-            ).generate_from_frequencies(neg_words)
-            plt.imshow(wordcloud_neg, interpolation='bilinear')
-        
-        plt.axis('off')
-        plt.tight_layout()
-        # Convert to base64
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', bbox_inches='tight', facecolor='black')
-        buf.seek(0)
-        img_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-        plt.close()
-        wordcloud_html = f'<img src="data:image/png;base64,{img_base64}" style="max-width: 600px; height: auto;">'
-    else:
-        wordcloud_html = '<p>No words available for word cloud.</p>'
-
     return (
-        score, rank, fig,
+        score, rank, chart_html,
         score_table_html, insights, word_table_html, wordcloud_html
     )
 
 def save_video(video_path, question):
-    if video_path:
-        shutil.copy(video_path, "../video/sample.mp4")
-    
-    # Run the bash script
-    try:
-        subprocess.run(["bash", "../run.sh"], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Error running run.sh: {e}")
-        return "Error running backend process", "", None, "", "", "", ""
-    
-    return dummy_submit(video_path, question)
-
-def run_interview(index, time_left, timer_active, skip=False):
-    # Handle skipping to the next question
-    if skip:
-        time_left = 90  # Reset timer
-        timer_active = True  # Keep timer active for the next question
-        index += 1
-
-    # Check if interview is complete
+    if not video_path:
+        yield "Please record or upload a video first", "", "", "", "", "", "", ""
+        return
+
+    # Queue the job and stream its progress back stage by stage
+    job = job_queue.submit(video_path, question)
+    empty = ("", "", "", "", "", "", "")
+    early_score = None
+    for stage, data in job.events():
+        if stage == "queued":
+            yield (*empty, f"⏳ Queued (job `{job.id[:8]}`)")
+        elif stage == "running":
+            yield (*empty, "🎙️ Transcribing your answer...")
+        elif stage == "transcribed":
+            yield (*empty, "📊 Analysing sentiment...")
+        elif stage == "sentiment":
+            # Show the sentiment half of the report while the LLM is still grading
+            pending = {"score": early_score, "observation": "Relevance evaluation in progress..."}
+            partial_report = dummy_submit(video_path, question, data["sentiment_summary"], pending)
+            if early_score is None:
+                yield ("Pending...", "Pending...", *partial_report[2:], "🤖 Evaluating relevance...")
+            else:
+                yield (*partial_report, "🤖 Writing feedback...")
+        elif stage == "score":
+            # The relevance score streams in before its explanation
+            early_score = data["relevance_score"]
+            summary = job.partial.get("sentiment_summary")
+            if summary is None:
+                continue  # shown with the sentiment report, which is right behind
+            pending = {"score": early_score, "observation": "Relevance evaluation in progress..."}
+            yield (*dummy_submit(video_path, question, summary, pending), "🤖 Writing feedback...")
+        elif stage == "done":
+            yield (*dummy_submit(video_path, question, data["sentiment_summary"], data["evaluation_output"]), "✅ Done")
+        elif stage == "failed":
+            print(f"❌ Error running evaluation pipeline: {data['error']}")
+            yield ("Error running backend process", "", "", "", "", "", "", "❌ Failed")
+
+# === Interview Countdown ===
+# The countdown runs in the browser; the server only keeps each question's absolute deadline
+QUESTION_SECONDS = 90
+DEADLINE_SLACK = 2  # seconds a browser clock may run ahead of ours
+
+COUNTDOWN_JS = """
+<script>
+(() => {
+  let seen = null, offset = 0, firedFor = null, firedAt = 0;
+  setInterval(() => {
+    const el = document.querySelector("#interview-countdown [data-deadline]");
+    if (!el) return;
+    if (el.dataset.deadline !== seen) {
+      seen = el.dataset.deadline;
+      offset = Number(el.dataset.serverNow) - Date.now();
+    }
+    const left = Math.max(0, Math.ceil((Number(seen) - (Date.now() + offset)) / 1000));
+    const text = `Time Left: ${Math.floor(left / 60)}:${String(left % 60).padStart(2, "0")}`;
+    if (el.textContent !== text) el.textContent = text;
+    // Ask the server to advance once per deadline; retry in case we fired a little early
+    if (left === 0 && (firedFor !== seen || Date.now() - firedAt > 3000)) {
+      firedFor = seen;
+      firedAt = Date.now();
+      document.getElementById("deadline-trigger")?.click();
+    }
+  }, 250);
+})();
+</script>
+"""
+
+def format_time_left(seconds):
+    mins, secs = divmod(math.ceil(seconds), 60)
+    return f"Time Left: {mins}:{secs:02d}"
+
+def countdown_html(deadline=None):
+    if deadline is None:
+        return f"<div class='countdown'>{format_time_left(QUESTION_SECONDS)}</div>"
+    now = time.time()
+    return (
+        f"<div class='countdown' data-deadline='{int(deadline * 1000)}' data-server-now='{int(now * 1000)}'>"
+        f"{format_time_left(max(0, deadline - now))}</div>"
+    )
+
+def show_question(index):
+    # Outputs: question, index, countdown, next button, deadline
     if index >= len(interview_questions_list):
         return (
             "<div class='question-box'>✅ Interview complete. Thank you!</div>",
             index,
-            "",
+            "<div class='countdown'>Time Left: 0:00</div>",
             gr.update(visible=False),
-            0,
-            False,
-            False  # Deactivate timer
+            None
         )
-
-    # Start or continue timer
-    if not timer_active:
-        timer_active = True
-        time_left = 90
-
-    # Update question
-    q = f"<div class='question-box'><strong>Q{index+1}:</strong> {interview_questions_list[index]}</div>"
-
-    # Update timer
-    if time_left > 0:
-        mins, secs = divmod(time_left, 60)
-        timer_text = f"Time Left: {mins}:{secs:02d}"
-        time_left -= 1
-    else:
-        # Timer finished, move to next question
-        timer_active = True  # Keep timer active for the next question
-        index += 1
-        time_left = 90
-        if index < len(interview_questions_list):
-            q = f"<div class='question-box'><strong>Q{index+1}:</strong> {interview_questions_list[index]}</div>"
-            mins, secs = divmod(time_left, 60)
-            timer_text = f"Time Left: {mins}:{secs:02d}"
-        else:
-            return (
-                "<div class='question-box'>✅ Interview complete. Thank you!</div>",
-                index,
-                "",
-                gr.update(visible=False),
-                0,
-                False,
-                False  # Deactivate timer
-            )
-
+    deadline = time.time() + QUESTION_SECONDS
     return (
-        q,
+        f"<div class='question-box'><strong>Q{index+1}:</strong> {interview_questions_list[index]}</div>",
         index,
-        timer_text,
+        countdown_html(deadline),
         gr.update(visible=True),
-        time_left,
-        timer_active,
-        True  # Keep timer active
+        deadline
     )
 
-def start_interview(index, time_left, timer_active):
-    # Reset states when starting the interview
+def next_question(index):
+    return show_question(index + 1)
+
+def deadline_reached(index, deadline):
+    # Fired by the browser when its countdown hits zero; only honoured once the stored deadline has passed
+    if deadline is None or time.time() < deadline - DEADLINE_SLACK:
+        return gr.update(), gr.update(), gr.update(), gr.update(), deadline
+    return next_question(index)
+
+def format_live_sentiment(summary):
+    if summary is None:
+        return "Waiting for the first complete sentence..."
     return (
-        "<div class='question-box'><strong>Q1:</strong> {}</div>".format(interview_questions_list[0]),
-        0,
-        "Time Left: 1:30",
-        gr.update(visible=True),
-        90,
-        True,
-        True  # Activate timer
+        f"**Sentiment so far:** {summary['average_sentiment_score']} average · "
+        f"{summary['positive_sentences']} positive / {summary['neutral_sentences']} neutral / "
+        f"{summary['negative_sentences']} negative sentences"
+    )
+
+def stream_answer(chunk, session_id, index):
+    # Transcribe and score the interview answer while the candidate is still speaking
+    if chunk is None or index >= len(interview_questions_list):
+        return session_id, gr.update(), gr.update()
+    session = live.get_session(session_id) if session_id else None
+    if session is None or session.index != index:
+        # Audio for the next question can arrive before finish_answer; the old session is graded on the side
+        session_id = live.start_session(interview_questions_list[index], index, previous_id=session_id)
+        session = live.get_session(session_id)
+    sample_rate, samples = chunk
+    session.add_audio(sample_rate, samples)
+    return session_id, session.transcript(), format_live_sentiment(session.sentiment_summary())
+
+def finish_answer(session_id, index):
+    # The question moved on: flush the last audio and run the LLM relevance call
+    session = live.get_session(session_id) if session_id else None
+    if session is not None and session.index == index:
+        # stream_answer already replaced the finished answer's session with the new question's
+        session_id = session.previous_id
+    result = live.finish_session(session_id) if session_id else None
+    if result is None:
+        return gr.update()
+    evaluation = result["evaluation_output"]
+    summary = result["sentiment_summary"]
+    sentiment = summary["average_sentiment_score"] if summary else "n/a"
+    return (
+        f"**Last answer** — Relevance: {evaluation['score']}/100 · Sentiment: {sentiment}<br>"
+        f"{evaluation['observation']}"
     )
 
+def start_interview():
+    # Reset states when starting the interview
+    return show_question(0)
+
 def reset_ui():
-    return get_random_question(), None, "", "", "", "", ""
+    return get_random_question(), None, "", "", "", "", "", "", ""
 
 # === UI Starts Here ===
-with gr.Blocks(css="""
+with gr.Blocks(head=COUNTDOWN_JS, css="""
   .question-box {
     background-color: #2e2e2e;
     padding: 15px;
@@ -358,6 +332,9 @@ with gr.Blocks(css="""
     color: #fff;
     font-weight: bold;
   }
+  .hidden-trigger {
+    display: none !important;
+  }
   .score-box {
     font-size: 32px !important;
     font-weight: bold;
@@ -368,9 +345,8 @@ with gr.Blocks(css="""
 
     question_state = gr.State(get_random_question())
     interview_index = gr.State(0)
-    time_left = gr.State(90)
-    timer_active = gr.State(False)
-    timer_state = gr.State(False)
+    deadline = gr.State(None)  # absolute time.time() when the current question ends
+    live_session = gr.State(None)
 
     with gr.Tabs():
         with gr.Tab("Practice Mode"):
@@ -389,6 +365,7 @@ with gr.Blocks(css="""
                         record_btn = gr.Button("▶ Record")
                         submit_btn = gr.Button("Submit", elem_classes="green-button")
                         reset_btn = gr.Button("Reset", elem_classes="red-button")
+                    status_box = gr.Markdown("")
 
                     gr.Markdown("### Final Evaluation")
                     score_box = gr.Textbox(label="Overall Score", interactive=False, elem_classes="score-box")
@@ -397,7 +374,7 @@ with gr.Blocks(css="""
 
                 with gr.Column(scale=1):
                     gr.Markdown("### Visual Breakdown")
-                    report_plot = gr.Plot()
+                    report_plot = gr.HTML()
                     gr.Markdown("#### Score Details")
                     score_table = gr.HTML()
                     gr.Markdown("#### Insights")
@@ -413,89 +390,43 @@ with gr.Blocks(css="""
 
             interview_question = gr.Markdown("<div class='question-box'>Press Start to begin your interview</div>")
             interview_video = gr.Video(elem_classes="video-interview")
-            interview_timer = gr.Textbox(value="Time Left: 1:30", interactive=False, label="⏱ Timer")
+            interview_audio = gr.Audio(sources=["microphone"], streaming=True, label="🎤 Live answer")
+            live_transcript = gr.Textbox(label="Live transcript", interactive=False, lines=4)
+            live_sentiment = gr.Markdown("")
+            live_result = gr.Markdown("")
+            gr.Markdown("⏱ Timer")
+            interview_timer = gr.HTML(countdown_html(), elem_id="interview-countdown")
             with gr.Row():
                 start_btn = gr.Button("Start Interview", elem_classes="green-button")
                 next_btn = gr.Button("Next Question", elem_classes="blue-button", visible=False)
+            # Clicked by the countdown script when time runs out
+            deadline_btn = gr.Button("Deadline", elem_id="deadline-trigger", elem_classes="hidden-trigger")
 
-            # Timer component to update every second
-            timer = gr.Timer(value=1, active=False)
+            question_outputs = [interview_question, interview_index, interview_timer, next_btn, deadline]
 
             # Start interview
-            start_btn.click(
-                fn=start_interview,
-                inputs=[interview_index, time_left, timer_active],
-                outputs=[
-                    interview_question,
-                    interview_index,
-                    interview_timer,
-                    next_btn,
-                    time_left,
-                    timer_active,
-                    timer_state
-                ]
+            start_btn.click(fn=start_interview, inputs=[], outputs=question_outputs)
+
+            # Time ran out in the browser; the server checks the deadline before advancing
+            deadline_btn.click(fn=deadline_reached, inputs=[interview_index, deadline], outputs=question_outputs)
+
+            # Live transcription and sentence-level sentiment while answering
+            interview_audio.stream(
+                fn=stream_answer,
+                inputs=[interview_audio, live_session, interview_index],
+                outputs=[live_session, live_transcript, live_sentiment],
+                stream_every=0.5
             )
 
-            # Update timer every second if timer_state is True
-            def update_timer_if_active(
-                index, time_left, timer_active, timer_state,
-                interview_question, interview_timer, next_btn
-            ):
-                if not timer_state:
-                    return (
-                        interview_question,
-                        index,
-                        interview_timer,
-                        next_btn,
-                        time_left,
-                        timer_active,
-                        timer_state,
-                        gr.Timer(active=False)
-                    )
-                result = run_interview(index, time_left, timer_active)
-                return (
-                    result[0],  # interview_question
-                    result[1],  # index
-                    result[2],  # interview_timer
-                    result[3],  # next_btn
-                    result[4],  # time_left
-                    result[5],  # timer_active
-                    result[6],  # timer_state
-                    gr.Timer(active=True)
-                )
-
-            timer.tick(
-                fn=update_timer_if_active,
-                inputs=[
-                    interview_index, time_left, timer_active, timer_state,
-                    interview_question, interview_timer, next_btn
-                ],
-                outputs=[
-                    interview_question,
-                    interview_index,
-                    interview_timer,
-                    next_btn,
-                    time_left,
-                    timer_active,
-                    timer_state,
-                    timer
-                ]
+            # Grade the finished answer whenever the question advances
+            interview_index.change(
+                fn=finish_answer,
+                inputs=[live_session, interview_index],
+                outputs=[live_result]
             )
 
             # Skip to next question
-            next_btn.click(
-                fn=lambda idx, tl, ta: run_interview(idx, tl, ta, skip=True),
-                inputs=[interview_index, time_left, timer_active],
-                outputs=[
-                    interview_question,
-                    interview_index,
-                    interview_timer,
-                    next_btn,
-                    time_left,
-                    timer_active,
-                    timer_state
-                ]
-            )
+            next_btn.click(fn=next_question, inputs=[interview_index], outputs=question_outputs)
 
     refresh_btn.click(
         fn=lambda: (f"<div class='question-box'><strong>Your Question:</strong><br>{get_random_question()}</div>", get_random_question()),
@@ -505,7 +436,7 @@ with gr.Blocks(css="""
 
     reset_btn.click(fn=reset_ui, inputs=[], outputs=[
         question_display, video_input,
-        score_box, rank_box, score_table, insights, word_table, word_cloud
+        score_box, rank_box, score_table, insights, word_table, word_cloud, status_box
     ])
 
     submit_btn.click(
@@ -513,8 +444,13 @@ with gr.Blocks(css="""
         inputs=[video_input, question_state],
         outputs=[
             score_box, rank_box, report_plot,
-            score_table, insights, word_table, word_cloud
-        ]
+            score_table, insights, word_table, word_cloud, status_box
+        ],
+        concurrency_limit=None  # handlers only wait on jobs; JobQueue bounds the real work
     )
 
-demo.launch()
\ No newline at end of file
+if __name__ == "__main__":
+    # Only the app itself warms up; importing this module (benchmark, tools) starts nothing
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    metrics.start_exporters()
+    demo.launch()
@@ -0,0 +1,96 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from pipeline import run_pipeline
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", str(os.cpu_count() or 4)))
+MAX_FINISHED_JOBS = 1000
+
+# --- A Single Submission ---
+class Job:
+    def __init__(self, video_path, question):
+        self.id = uuid.uuid4().hex
+        self.video_path = video_path
+        self.question = question
+        self.status = "queued"
+        self.stage = None
+        self.partial = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._events = queue.Queue()
+
+    def _publish(self, stage, data=None):
+        self.stage = stage
+        if data:
+            self.partial.update(data)
+        self._events.put((stage, data or {}))
+
+    def events(self):
+        # Yield (stage, data) as the worker reports them, until the job finishes
+        while True:
+            stage, data = self._events.get()
+            yield stage, data
+            if stage in ("done", "failed"):
+                return
+
+    def snapshot(self):
+        # For polling clients that don't hold on to the events() iterator
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "partial": dict(self.partial),
+            "error": self.error,
+            "queue_wait": round(self.started_at - self.created_at, 4) if self.started_at else None
+        }
+
+# --- Worker Pool ---
+class JobQueue:
+    def __init__(self, workers=JOB_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, video_path, question):
+        job = Job(video_path, question)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        job._publish("queued")
+        self._pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def _run(self, job):
+        job.started_at = time.time()
+        metrics.observe("queue_wait_seconds", job.started_at - job.created_at, queue="jobs")
+        job.status = "running"
+        job._publish("running")
+        try:
+            job.result = run_pipeline(job.video_path, job.question, job_id=job.id, on_progress=job._publish)
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+            job.finished_at = time.time()
+            job._publish("failed", {"error": job.error})
+            return
+        job.status = "done"
+        job.finished_at = time.time()
+        job._publish("done", job.result)
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import audio
+from run import submit_pcm_transcription, shift_segments, cut_silence_chunks, BYTES_PER_SECOND
+from final_sentence_wise_sentiment import IncrementalSentimentAnalyzer, transcription_to_text
+from relevance import score_answer, MAX_IN_FLIGHT
+from pipeline import WHISPER_MODEL_PATH
+
+# Transcribe live audio in windows of about this length, cut in a pause
+WINDOW_SECONDS = 4
+SEARCH_SECONDS = 1.5
+# Sessions with no audio for this long (tab closed mid-answer) are dropped
+SESSION_TTL = int(os.environ.get("LIVE_SESSION_TTL", "900"))
+# Replaced answers graded at once; each mostly waits on the LLM, so match its concurrency
+FINISH_WORKERS = int(os.environ.get("LIVE_FINISH_WORKERS", str(MAX_IN_FLIGHT)))
+
+# --- One Answer Being Spoken ---
+class LiveAnswerSession:
+    def __init__(self, question, index=0, model_path=WHISPER_MODEL_PATH, previous_id=None):
+        self.question = question
+        self.index = index
+        self.model_path = model_path
+        self.previous_id = previous_id  # session of the answer before this one, graded in the background
+        self.last_active = time.monotonic()
+        self.segments = []
+        self.sentiment = IncrementalSentimentAnalyzer()
+        self.finished = False
+        self.result = None
+        self._pcm = bytearray()
+        self._pcm_offset = 0   # bytes of audio before self._pcm
+        self._pending = []     # (offset_ms, future) in audio order
+        self._lock = threading.Lock()
+
+    def add_audio(self, sample_rate, samples):
+        # Append a microphone chunk; full windows are sent off for transcription right away
+        with self._lock:
+            if self.finished:
+                return
+            self.last_active = time.monotonic()
+            self._pcm += audio.to_pcm16k(sample_rate, samples)
+            for window in cut_silence_chunks(self._pcm, WINDOW_SECONDS, SEARCH_SECONDS):
+                self._submit(window)
+            self._collect(wait=False)
+
+    def _submit(self, pcm):
+        offset_ms = self._pcm_offset * 1000 // BYTES_PER_SECOND
+        self._pending.append((offset_ms, submit_pcm_transcription(pcm, self.model_path)))
+        self._pcm_offset += len(pcm)
+
+    def _collect(self, wait):
+        # Take finished windows in order and score any sentences they complete
+        while self._pending and (wait or self._pending[0][1].done()):
+            offset_ms, future = self._pending.pop(0)
+            new_segments = shift_segments(future.result()["transcription"], offset_ms)
+            self.segments.extend(new_segments)
+            # Only the newly completed sentences are scored; the running summary is kept up to date
+            self.sentiment.add_segments(new_segments)
+
+    def transcript(self):
+        return transcription_to_text({"transcription": self.segments}).strip()
+
+    def sentiment_summary(self):
+        return self.sentiment.summary()
+
+    def finish(self):
+        # Flush the tail, wait for the last windows, then only the LLM call is left
+        with self._lock:
+            if self.finished:
+                return self.result
+            if self._pcm:
+                self._submit(bytes(self._pcm))
+                self._pcm.clear()
+            self._collect(wait=True)
+            self.sentiment.flush()
+            answer = self.transcript()
+            self.result = {
+                "answer": answer,
+                "sentiment_results": self.sentiment.results,
+                "sentiment_summary": self.sentiment_summary(),
+                "evaluation_output": score_answer(self.question, answer)
+            }
+            self.finished = True
+            return self.result
+
+# Sessions are kept here and only their IDs go into gr.State
+_sessions = {}
+_sessions_lock = threading.Lock()
+# Answers replaced by the next question's session are graded here, off the audio stream
+_finish_pool = ThreadPoolExecutor(max_workers=FINISH_WORKERS, thread_name_prefix="live-finish")
+_replaced = {}  # session_id -> (future with its result, when it was replaced), until finish_session reads it
+
+def _evict_stale():
+    cutoff = time.monotonic() - SESSION_TTL
+    with _sessions_lock:
+        stale = [session_id for session_id, session in _sessions.items() if session.last_active < cutoff]
+        for session_id in stale:
+            del _sessions[session_id]
+        for session_id, (_, replaced_at) in list(_replaced.items()):
+            if replaced_at < cutoff:
+                del _replaced[session_id]
+    if stale:
+        print(f"[INFO] Dropped {len(stale)} idle live session(s)")
+
+def start_session(question, index, previous_id=None):
+    # previous_id is the session of the last question; it is taken out and graded in the background
+    _evict_stale()
+    session_id = uuid.uuid4().hex
+    with _sessions_lock:
+        previous = _sessions.pop(previous_id, None) if previous_id else None
+        if previous is not None:
+            _replaced[previous_id] = (_finish_pool.submit(previous.finish), time.monotonic())
+        _sessions[session_id] = LiveAnswerSession(question, index, previous_id=previous_id if previous else None)
+    return session_id
+
+def get_session(session_id):
+    with _sessions_lock:
+        return _sessions.get(session_id)
+
+def finish_session(session_id):
+    # Also answers for a session that start_session already replaced and is grading in the background
+    with _sessions_lock:
+        session = _sessions.pop(session_id, None)
+        replaced = _replaced.pop(session_id, None)
+    if session is not None:
+        return session.finish()
+    return replaced[0].result() if replaced else None
@@ -0,0 +1,245 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Exporter settings; METRICS_PORT=0 turns the HTTP endpoint off
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9464"))
+# Local only by default, like the Gradio app; set METRICS_HOST=0.0.0.0 for a remote scraper
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_JSON_PATH = os.environ.get("METRICS_JSON_PATH", "")
+METRICS_JSON_INTERVAL = float(os.environ.get("METRICS_JSON_INTERVAL", "60"))
+
+PREFIX = "pitchperfect"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+RECENT_SAMPLES = 1024  # kept per series for the p50/p95 in the JSON dump
+
+# --- Series ---
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def quantile(self, q):
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> Histogram
+_counters = {}    # (name, labels) -> float
+_caches = {}      # cache name -> stats() callable
+_help = {
+    "stage_seconds": "Time spent in each hot-path stage",
+    "stage_errors_total": "Stage calls that raised",
+    "queue_wait_seconds": "Time a unit of work waited for a free worker",
+    "llm_request_seconds": "Wall time of one LLM call, as seen by the client",
+    "llm_load_seconds": "Model load time reported by Ollama",
+    "llm_prompt_tokens_total": "Prompt tokens evaluated by Ollama",
+    "llm_completion_tokens_total": "Tokens generated by Ollama",
+    "llm_tokens_per_second": "Generation speed reported by Ollama",
+    "llm_warmups_total": "Times the LLM was loaded ahead of a request",
+    "llm_first_score_seconds": "Time from request to the relevance score appearing in the stream",
+    "llm_parse_fallbacks_total": "Structured replies that were not valid JSON",
+    "relevance_tier_total": "Relevance results by the tier that decided them (local, cache, llm)",
+    "vad_trimmed_seconds_total": "Seconds of non-speech audio cut before transcription",
+    "cache_hits_total": "Cache lookups that found an entry",
+    "cache_misses_total": "Cache lookups that found nothing",
+    "cache_hit_ratio": "Hits over lookups since start",
+    "cache_entries": "Entries currently held"
+}
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def observe(name, value, **labels):
+    with _lock:
+        key = _key(name, labels)
+        if key not in _histograms:
+            _histograms[key] = Histogram()
+        _histograms[key].observe(value)
+
+def inc(name, value=1, **labels):
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + value
+
+@contextmanager
+def span(stage):
+    # with metrics.span("whisper"): ... records stage_seconds{stage="whisper"}
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        inc("stage_errors_total", stage=stage)
+        raise
+    finally:
+        observe("stage_seconds", time.perf_counter() - start, stage=stage)
+
+def timed(stage):
+    # Decorator form of span()
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+def register_cache(name, stats):
+    # stats() returns a dict with hits, misses and size, like DiskCache.stats()
+    with _lock:
+        _caches[name] = stats
+
+def record_llm(response, seconds, model):
+    # Ollama reports durations in nanoseconds; fields are missing on some error paths
+    observe("llm_request_seconds", seconds, model=model)
+    prompt_tokens = getattr(response, "prompt_eval_count", None) or 0
+    completion_tokens = getattr(response, "eval_count", None) or 0
+    inc("llm_prompt_tokens_total", prompt_tokens, model=model)
+    inc("llm_completion_tokens_total", completion_tokens, model=model)
+    load_duration = getattr(response, "load_duration", None)
+    if load_duration:
+        observe("llm_load_seconds", load_duration / 1e9, model=model)
+    eval_duration = getattr(response, "eval_duration", None)
+    if eval_duration and completion_tokens:
+        observe("llm_tokens_per_second", completion_tokens / (eval_duration / 1e9), model=model)
+
+# --- Export ---
+def _cache_rows():
+    rows = {}
+    for name, stats in list(_caches.items()):
+        try:
+            rows[name] = stats()
+        except Exception as e:
+            print(f"[INFO] Could not read stats for cache {name}: {e}")
+    return rows
+
+def _labels_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+def render_prometheus():
+    # Prometheus text exposition format, version 0.0.4
+    lines = []
+    with _lock:
+        histograms = {key: (list(h.counts), h.sum, h.count) for key, h in _histograms.items()}
+        counters = dict(_counters)
+    seen = set()
+
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {PREFIX}_{name} {_help.get(name, name)}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+    for (name, labels), (counts, total, count) in sorted(histograms.items()):
+        header(name, "histogram")
+        cumulative = 0
+        for bound, n in zip(BUCKETS + ("+Inf",), counts):
+            cumulative += n
+            lines.append(f"{PREFIX}_{name}_bucket{_labels_text(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{PREFIX}_{name}_sum{_labels_text(labels)} {total}")
+        lines.append(f"{PREFIX}_{name}_count{_labels_text(labels)} {count}")
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter")
+        lines.append(f"{PREFIX}_{name}{_labels_text(labels)} {value}")
+    for cache, stats in sorted(_cache_rows().items()):
+        labels = [("cache", cache)]
+        lookups = stats["hits"] + stats["misses"]
+        for name, kind, value in (
+            ("cache_hits_total", "counter", stats["hits"]),
+            ("cache_misses_total", "counter", stats["misses"]),
+            ("cache_hit_ratio", "gauge", stats["hits"] / lookups if lookups else 0.0),
+            ("cache_entries", "gauge", stats["size"])
+        ):
+            header(name, kind)
+            lines.append(f"{PREFIX}_{name}{_labels_text(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+def snapshot():
+    # Same data as render_prometheus, shaped for a JSON dump
+    with _lock:
+        histograms = {}
+        for (name, labels), h in sorted(_histograms.items()):
+            histograms.setdefault(name, []).append({
+                "labels": dict(labels),
+                "count": h.count,
+                "sum": round(h.sum, 6),
+                "p50": h.quantile(0.5),
+                "p95": h.quantile(0.95)
+            })
+        counters = {}
+        for (name, labels), value in sorted(_counters.items()):
+            counters.setdefault(name, []).append({"labels": dict(labels), "value": value})
+    return {"timestamp": time.time(), "histograms": histograms, "counters": counters, "caches": _cache_rows()}
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = render_prometheus(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(snapshot()), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def start_http_server(port=METRICS_PORT, host=METRICS_HOST):
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"[INFO] Metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+def start_json_dump(path=METRICS_JSON_PATH, interval=METRICS_JSON_INTERVAL):
+    def loop():
+        while True:
+            time.sleep(interval)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot(), f, indent=2)
+            os.replace(tmp, path)
+    threading.Thread(target=loop, name="metrics-dump", daemon=True).start()
+
+def start_exporters():
+    # Called by the app: HTTP endpoint unless METRICS_PORT=0, JSON dump when METRICS_JSON_PATH is set
+    if METRICS_PORT:
+        try:
+            start_http_server(METRICS_PORT)
+        except OSError as e:
+            print(f"[INFO] Metrics endpoint not started on port {METRICS_PORT}: {e}")
+    if METRICS_JSON_PATH:
+        start_json_dump(METRICS_JSON_PATH, METRICS_JSON_INTERVAL)
@@ -0,0 +1,148 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import whisper_server
+from run import (
+    extract_audio_with_ffmpeg, transcribe_chunked, transcribe_video_stream, can_stream_audio,
+    get_transcript_cache, transcript_key, TRANSCRIBE_WORKERS
+)
+from final_sentence_wise_sentiment import (
+    transcription_to_text, analyze_segments, save_results, summarize_and_plot,
+    warm_up as warm_up_sentiment
+)
+import relevance
+from relevance import score_answer
+
+WHISPER_MODEL_PATH = "../../whisper.cpp/models/ggml-base.en.bin"
+WORKSPACE_ROOT = os.path.join(tempfile.gettempdir(), "pitchperfect")
+
+# Runs the relevance call alongside sentiment; both only need the transcript
+_fanout_pool = ThreadPoolExecutor(thread_name_prefix="stage")
+
+# --- Per-Job Workspaces ---
+@contextmanager
+def job_workspace(job_id=None, root=WORKSPACE_ROOT):
+    # Each submission gets its own scratch dir so concurrent jobs never share files
+    job_id = job_id or uuid.uuid4().hex
+    workdir = os.path.join(root, job_id)
+    os.makedirs(workdir)
+    try:
+        yield job_id, workdir
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+# --- Stage Timing ---
+class StageTimer:
+    def __init__(self):
+        self.timings = {}
+
+    def run(self, stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.timings[stage] = round(time.perf_counter() - start, 4)
+
+def warm_up(model_path=WHISPER_MODEL_PATH, warm_llm=True):
+    # Load the VADER lexicon, start whisper-server and load the LLM before the first submission arrives.
+    # warm_llm=False leaves the LLM to callers that grade with a model other than the default
+    warm_up_sentiment()
+    if can_stream_audio():
+        whisper_server.get_service(model_path, workers=TRANSCRIBE_WORKERS)
+    if warm_llm:
+        relevance.warm_up()
+
+# --- Full Evaluation Pipeline ---
+def run_pipeline(video_path, question, workdir=None, model_path=WHISPER_MODEL_PATH, job_id=None, on_progress=None):
+    # on_progress(stage, data) is called with partial results as each stage completes
+    if workdir is None:
+        with job_workspace(job_id) as (job_id, job_dir):
+            result = _run_stages(video_path, question, job_dir, model_path, on_progress)
+            result["job_id"] = job_id
+            return result
+    return _run_stages(video_path, question, workdir, model_path, on_progress)
+
+def transcribe_video(video_path, workdir, model_path=WHISPER_MODEL_PATH, timer=None):
+    timer = timer or StageTimer()
+    audio_path = os.path.join(workdir, "output.wav")
+    output_json = os.path.join(workdir, "whisper_transcription.json")
+
+    # A re-submitted clip skips extraction and transcription entirely
+    key = timer.run("hash", transcript_key, video_path, model_path)
+    transcription = get_transcript_cache().get(key)
+    if transcription is None:
+        if can_stream_audio():
+            # ffmpeg PCM is piped straight into whisper-server, extraction overlaps transcription
+            transcription = timer.run("transcribe", transcribe_video_stream, video_path, model_path, output_json)
+        else:
+            timer.run("extract", extract_audio_with_ffmpeg, video_path, audio_path)
+            transcription = timer.run("transcribe", transcribe_chunked, audio_path, model_path, output_json)
+        get_transcript_cache().put(key, transcription)
+    return transcription
+
+def _run_stages(video_path, question, workdir, model_path, on_progress=None):
+    # Stages hand Python objects to each other instead of re-reading JSON files
+    timer = StageTimer()
+    progress = on_progress or (lambda stage, data: None)
+
+    transcription = transcribe_video(video_path, workdir, model_path, timer)
+    answer = transcription_to_text(transcription).strip()
+    progress("transcribed", {"transcription": transcription, "answer": answer})
+
+    # Fan out: LLM relevance in the background while sentiment runs here, then join.
+    # The score is streamed back on its own before the explanation is finished
+    relevance_future = _fanout_pool.submit(
+        timer.run, "relevance", score_answer, question, answer,
+        on_score=lambda score: progress("score", {"relevance_score": score})
+    )
+
+    # Sentiment works on the segments themselves, so every sentence keeps its timestamps
+    analyzer = timer.run("sentiment", analyze_segments, transcription["transcription"])
+    sentiment_results = analyzer.results
+    # No speech (silent clip, or everything trimmed) is still a result: an empty summary,
+    # and the relevance tier's "no answer" grade
+    sentiment_summary = timer.run("summary", analyzer.summary) or {}
+    sentiment_timeline = analyzer.timeline().to_dict()
+    progress("sentiment", {
+        "sentiment_results": sentiment_results,
+        "sentiment_summary": sentiment_summary,
+        "sentiment_timeline": sentiment_timeline
+    })
+
+    evaluation_output = relevance_future.result()
+    progress("relevance", {"evaluation_output": evaluation_output})
+
+    print(f"[INFO] Pipeline timings: {timer.timings}")
+    return {
+        "transcription": transcription,
+        "answer": answer,
+        "sentiment_results": sentiment_results,
+        "sentiment_summary": sentiment_summary,
+        "sentiment_timeline": sentiment_timeline,
+        "evaluation_output": evaluation_output,
+        "timings": timer.timings
+    }
+
+# === Main ===
+if __name__ == "__main__":
+    video_path = "../video/sample.mp4"
+    question = "Tell me about a time you disagreed with your boss / Supervisor."
+
+    result = run_pipeline(video_path, question, workdir=".")
+
+    # Keep the same artifacts the old script chain produced
+    if result["sentiment_results"]:
+        save_results(result["sentiment_results"])
+        summarize_and_plot(result["sentiment_results"])
+    with open("evaluation_output.json", "w", encoding="utf-8") as f:
+        json.dump(result["evaluation_output"], f, indent=2)
+
+    print("\n=== Transcript ===")
+    print(result["answer"])
+    print("\nJSON Output:\n", json.dumps(result["evaluation_output"], indent=2))
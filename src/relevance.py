@@ -1,15 +1,35 @@
-from ollama import chat, ChatResponse
+import asyncio
+import os
 import re
 import json
+import threading
+import time
 
-# --- Ollama Evaluation Function ---
-def evaluate_answer(question, answer, model="llama3.2"):
-    prompt = f"""You are an interview evaluator.
+import metrics
+from cache import CACHE_DIR, DiskCache, cache_key
 
-Question: {question}
+DEFAULT_MODEL = "llama3.2"
+# Bump whenever SYSTEM_PROMPT / build_messages change, so cached scores from the old prompt are not reused
+PROMPT_VERSION = 2
+RELEVANCE_CACHE_SIZE = int(os.environ.get("RELEVANCE_CACHE_SIZE", "10000"))
+# Limits for the shared async client
+MAX_IN_FLIGHT = int(os.environ.get("OLLAMA_MAX_IN_FLIGHT", "4"))
+REQUEST_TIMEOUT = float(os.environ.get("OLLAMA_TIMEOUT", "120"))
+MAX_RETRIES = int(os.environ.get("OLLAMA_RETRIES", "2"))
+# How long Ollama keeps the model loaded after a request ("30m", "1h", seconds, or -1 for forever)
+KEEP_ALIVE = os.environ.get("RELEVANCE_KEEP_ALIVE", "30m")
+HEALTH_CHECK_INTERVAL = float(os.environ.get("RELEVANCE_HEALTH_INTERVAL", "60"))
+# Structured mode: schema-constrained JSON, streamed, at most MAX_TOKENS generated; "0" keeps the free-text reply
+STRUCTURED_OUTPUT = os.environ.get("RELEVANCE_STRUCTURED", "1") != "0"
+MAX_TOKENS = int(os.environ.get("RELEVANCE_MAX_TOKENS", "160"))
+# The local tier settles an answer when its confidence is at least this; above 1 sends everything to the LLM
+ROUTE_THRESHOLD = float(os.environ.get("RELEVANCE_ROUTE_THRESHOLD", "0.9"))
+MIN_ANSWER_WORDS = int(os.environ.get("RELEVANCE_MIN_WORDS", "10"))
 
-Answer: {answer}
+# Fixed instructions go first and never change, so Ollama can reuse their KV cache between requests
+SYSTEM_PROMPT = """You are an interview evaluator.
 
+You will be given an interview question and a candidate's answer.
 Evaluate how well the answer responds to the question.
 
 Respond in the following format:
@@ -17,19 +37,373 @@ Score: <numeric score between 0 and 100>
 
 Explanation: <brief justification>"""
 
+SYSTEM_PROMPT_JSON = """You are an interview evaluator.
+
+You will be given an interview question and a candidate's answer.
+Evaluate how well the answer responds to the question.
+
+Respond with a JSON object: "score" is a whole number between 0 and 100,
+"explanation" is a brief justification in one or two sentences."""
+
+# "score" comes first, so the constrained decoder emits it before the explanation
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "integer", "minimum": 0, "maximum": 100},
+        "explanation": {"type": "string"}
+    },
+    "required": ["score", "explanation"]
+}
+
+def build_messages(question, answer, structured=False):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT_JSON if structured else SYSTEM_PROMPT},
+        {"role": "user", "content": f"Question: {question}\n\nAnswer: {answer}"}
+    ]
+
+def keep_alive():
+    # Ollama takes a duration string or a number of seconds
     try:
-        response: ChatResponse = chat(
-            model=model,
-            messages=[{
-                "role": "user",
-                "content": prompt
-            }]
-        )
+        return float(KEEP_ALIVE)
+    except ValueError:
+        return KEEP_ALIVE
+
+def model_tag(model):
+    # ps() reports "llama3.2:latest" for a model requested as "llama3.2"
+    return model if ":" in model else f"{model}:latest"
+
+# --- Ollama Evaluation Function ---
+def evaluate_answer(question, answer, model=DEFAULT_MODEL):
+    from ollama import chat, ChatResponse
+
+    try:
+        start = time.perf_counter()
+        with metrics.span("llm"):
+            response: ChatResponse = chat(
+                model=model,
+                messages=build_messages(question, answer),
+                keep_alive=keep_alive()
+            )
+        metrics.record_llm(response, time.perf_counter() - start, model)
         return response.message.content
     except Exception as e:
         return f"Error: {e}"
 
+# --- Local First Tier ---
+# Words that say nothing about the topic of an interview question
+STOPWORDS = set("""
+a about above after again against all am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here hers
+him his how i if in into is it its itself just me more most my no nor not now of off on once only or other our
+ours out over own same she should so some such than that the their them then there these they this those
+through to too under until up very was we were what when where which while who whom why will with would you
+your yours yourself tell describe explain give talk walk share example time times situation something someone
+think thing things like really um uh okay yeah so well
+""".split())
+SUFFIXES = ("ment", "ing", "edly", "ed", "ly", "er")
+# Below the default ROUTE_THRESHOLD: sharing no words is a hint, synonyms still deserve the LLM
+NO_OVERLAP_CONFIDENCE = 0.85
+
+def _stem(word):
+    # Plurals first, so "managers" / "manager" and "bosses" / "boss" end up the same
+    if word.endswith("sses"):
+        word = word[:-2]
+    elif word.endswith("ies") and len(word) > 4:
+        word = word[:-3] + "y"
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")) and len(word) > 3:
+        word = word[:-1]
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    # "manage" / "managing", "deadline" / "deadlined"
+    if word.endswith("e") and len(word) > 4:
+        return word[:-1]
+    return word
+
+def _terms(text):
+    return [_stem(w) for w in re.findall(r"[a-z']+", text.lower()) if w not in STOPWORDS]
+
+def quick_score(question, answer):
+    # Cheap lexical check; returns (result, confidence). Only sure about answers that are
+    # missing, too short to grade, or share no topic words with a specific question.
+    words = answer.split()
+    if not words:
+        return {"score": 0, "observation": "No answer was detected in the recording."}, 1.0
+    if len(words) < MIN_ANSWER_WORDS:
+        return {"score": 5, "observation": "The answer is too short to address the question."}, 0.95
+    question_terms = set(_terms(question))
+    answer_terms = set(_terms(answer))
+    if not question_terms:
+        return {"score": None, "observation": ""}, 0.0
+    coverage = len(question_terms & answer_terms) / len(question_terms)
+    if coverage == 0:
+        # The more specific the question, the less likely a relevant answer avoids all of its terms,
+        # but never sure enough on its own to skip the LLM at the default threshold
+        confidence = min(1 - 0.5 ** len(question_terms), NO_OVERLAP_CONFIDENCE)
+        return {"score": 10, "observation": "The answer does not appear to address the question's topic."}, confidence
+    return {"score": round(100 * coverage), "observation": ""}, 0.3 * coverage
+
+# --- Relevance Result Cache ---
+_relevance_cache = None
+_cache_lock = threading.Lock()
+
+def get_relevance_cache():
+    global _relevance_cache
+    with _cache_lock:
+        if _relevance_cache is None:
+            _relevance_cache = DiskCache(os.path.join(CACHE_DIR, "relevance.sqlite"), max_entries=RELEVANCE_CACHE_SIZE)
+            metrics.register_cache("relevance", _relevance_cache.stats)
+        return _relevance_cache
+
+def normalize_answer(answer):
+    return " ".join(answer.lower().split())
+
+def relevance_key(question, answer, model, structured=False):
+    return cache_key(question.strip(), normalize_answer(answer), model, PROMPT_VERSION, "json" if structured else "text")
+
+# --- Async Evaluator with a Pooled Client ---
+def _is_retryable(error):
+    import httpx
+    from ollama import ResponseError
+    if isinstance(error, ResponseError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, (asyncio.TimeoutError, httpx.TransportError, ConnectionError))
+
+class AsyncRelevanceEvaluator:
+    def __init__(self, model=DEFAULT_MODEL, host=None, max_in_flight=MAX_IN_FLIGHT,
+                 timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES, backoff=0.5,
+                 structured=STRUCTURED_OUTPUT, max_tokens=MAX_TOKENS):
+        self.model = model
+        self.structured = structured
+        self.max_tokens = max_tokens
+        self.host = host
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._client = None
+        self._semaphore = None
+
+    def _ensure_client(self):
+        # Created lazily so the client and semaphore belong to the running event loop
+        if self._client is None:
+            import httpx
+            from ollama import AsyncClient
+            limits = httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight)
+            self._client = AsyncClient(host=self.host, timeout=self.timeout, limits=limits)
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+    async def _with_retries(self, call):
+        # call() makes one attempt. A slot is held only while it runs, never during the backoff,
+        # so a failing request doesn't keep one of the max_in_flight slots asleep
+        for attempt in range(self.max_retries + 1):
+            queued_at = time.perf_counter()
+            async with self._semaphore:
+                metrics.observe("queue_wait_seconds", time.perf_counter() - queued_at, queue="llm")
+                try:
+                    return await call()
+                except Exception as e:
+                    if attempt == self.max_retries or not _is_retryable(e):
+                        raise
+                    error = e
+            delay = self.backoff * (2 ** attempt)
+            print(f"[INFO] LLM call failed ({error!r}), retrying in {delay:.1f}s...")
+            await asyncio.sleep(delay)
+
+    async def evaluate(self, question, answer):
+        self._ensure_client()
+        messages = build_messages(question, answer)
+
+        async def attempt():
+            start = time.perf_counter()
+            with metrics.span("llm"):
+                response = await asyncio.wait_for(
+                    self._client.chat(model=self.model, messages=messages, keep_alive=keep_alive()),
+                    self.timeout
+                )
+            metrics.record_llm(response, time.perf_counter() - start, self.model)
+            return response.message.content
+
+        try:
+            return await self._with_retries(attempt)
+        except Exception as e:
+            return f"Error: {e}"
+
+    async def evaluate_structured(self, question, answer, on_score=None):
+        # Streams the JSON reply; on_score(score) fires once, as soon as the score's digits are complete.
+        # Returns {"score", "observation"}.
+        self._ensure_client()
+        messages = build_messages(question, answer, structured=True)
+        notified = False
+
+        def notify(score):
+            # A retry streams the reply again; the caller has already been told
+            nonlocal notified
+            if on_score and not notified:
+                notified = True
+                on_score(score)
+
+        async def attempt():
+            reply = {"text": "", "score": None, "last": None}
+            start = time.perf_counter()
+            with metrics.span("llm"):
+                await asyncio.wait_for(self._stream_reply(messages, reply, start, notify), self.timeout)
+            last = reply["last"]
+            if last is not None and last.done:
+                metrics.record_llm(last, time.perf_counter() - start, self.model)
+            return parse_structured(reply["text"])
+
+        try:
+            return await self._with_retries(attempt)
+        except Exception as e:
+            return {"score": None, "observation": f"Error: {e}"}
+
+    async def _stream_reply(self, messages, reply, start, on_score):
+        stream = await self._client.chat(
+            model=self.model,
+            messages=messages,
+            format=RESPONSE_SCHEMA,
+            options={"num_predict": self.max_tokens},
+            stream=True,
+            keep_alive=keep_alive()
+        )
+        try:
+            async for part in stream:
+                reply["last"] = part
+                reply["text"] += part.message.content
+                if reply["score"] is None:
+                    reply["score"] = early_score(reply["text"])
+                    if reply["score"] is not None:
+                        metrics.observe("llm_first_score_seconds", time.perf_counter() - start, model=self.model)
+                        on_score(reply["score"])
+        finally:
+            # Closing the stream on a timeout drops the connection, which stops generation on the server
+            await stream.aclose()
+
+    async def warm_up(self):
+        # Load the model and prefill the system prompt, so the first candidate doesn't pay for either
+        self._ensure_client()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._client.chat(
+                model=self.model,
+                messages=[{"role": "system", "content": SYSTEM_PROMPT_JSON if self.structured else SYSTEM_PROMPT}],
+                options={"num_predict": 1},
+                keep_alive=keep_alive()
+            ), self.timeout)
+        except Exception as e:
+            print(f"[INFO] Could not warm up {self.model}: {e!r}")
+            return False
+        metrics.inc("llm_warmups_total", model=self.model)
+        print(f"[INFO] {self.model} warm in {time.perf_counter() - start:.2f}s (keep_alive={KEEP_ALIVE})")
+        return True
+
+    async def health_check(self):
+        # Is Ollama up, and is our model resident? Uses /api/ps, which never loads anything
+        self._ensure_client()
+        try:
+            running = await asyncio.wait_for(self._client.ps(), 10)
+        except Exception as e:
+            return {"ok": False, "loaded": False, "error": str(e)}
+        for entry in running.models:
+            if entry.model == model_tag(self.model) or entry.name == model_tag(self.model):
+                return {
+                    "ok": True,
+                    "loaded": True,
+                    "expires_at": entry.expires_at.isoformat() if entry.expires_at else None,
+                    "size_vram": entry.size_vram
+                }
+        return {"ok": True, "loaded": False}
+
+    async def keep_resident(self, interval=HEALTH_CHECK_INTERVAL):
+        # Re-warm whenever the model has been unloaded (server restart, eviction, expired keep_alive)
+        while True:
+            await asyncio.sleep(interval)
+            status = await self.health_check()
+            if not status["ok"]:
+                print(f"[INFO] Ollama health check failed: {status['error']}")
+            elif not status["loaded"]:
+                print(f"[INFO] {self.model} is no longer loaded, warming it up again...")
+                await self.warm_up()
+
+    async def score(self, question, answer, on_score=None, route_threshold=None):
+        # Parsed {"score", "observation", "tier"}: the local tier when it is confident enough,
+        # otherwise the LLM, served from the on-disk cache when possible
+        threshold = ROUTE_THRESHOLD if route_threshold is None else route_threshold
+        local, confidence = quick_score(question, answer)
+        if confidence >= threshold:
+            metrics.inc("relevance_tier_total", tier="local")
+            if on_score:
+                on_score(local["score"])
+            return {**local, "tier": "local"}
+
+        # SQLite reads and writes (each with a commit) run off the event loop, so streams in flight don't stall
+        key = relevance_key(question, answer, self.model, self.structured)
+        cached = await asyncio.to_thread(lambda: get_relevance_cache().get(key))
+        if cached is not None:
+            metrics.inc("relevance_tier_total", tier="cache")
+            if on_score and cached["score"] is not None:
+                on_score(cached["score"])
+            return {**cached, "tier": "cache"}
+        metrics.inc("relevance_tier_total", tier="llm")
+        if self.structured:
+            result = await self.evaluate_structured(question, answer, on_score)
+        else:
+            raw = await self.evaluate(question, answer)
+            result = extract_score_and_observation(raw)
+            if on_score and result["score"] is not None:
+                on_score(result["score"])
+        if result["score"] is not None and not result["observation"].startswith("Error:"):
+            await asyncio.to_thread(lambda: get_relevance_cache().put(key, result))
+        return {**result, "tier": "llm"}
+
+    async def evaluate_batch(self, pairs):
+        # Grade many (question, answer) pairs; concurrency is still capped by the semaphore
+        return await asyncio.gather(*(self.score(q, a) for q, a in pairs))
+
+# One event loop thread owns the shared evaluator, so sync callers can use it too
+_loop = None
+_evaluator = None
+_loop_lock = threading.Lock()
+
+def get_evaluator():
+    global _loop, _evaluator
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="relevance-loop", daemon=True).start()
+            _evaluator = AsyncRelevanceEvaluator()
+        return _loop, _evaluator
+
+def score_answer(question, answer, on_score=None):
+    # on_score(score) is called from the event loop thread as soon as the score is known
+    loop, evaluator = get_evaluator()
+    return asyncio.run_coroutine_threadsafe(evaluator.score(question, answer, on_score), loop).result()
+
+def evaluate_batch(pairs):
+    loop, evaluator = get_evaluator()
+    return asyncio.run_coroutine_threadsafe(evaluator.evaluate_batch(pairs), loop).result()
+
+_monitor = None
+
+def warm_up(keep_resident=True, evaluator=None):
+    # Called at startup: load the model now, then keep checking that it stays loaded.
+    # evaluator defaults to the shared one; a batch re-grade passes its own so only its model is pinned
+    global _monitor
+    loop, shared = get_evaluator()
+    evaluator = evaluator or shared
+    warm = asyncio.run_coroutine_threadsafe(evaluator.warm_up(), loop).result()
+    with _loop_lock:
+        if keep_resident and _monitor is None and HEALTH_CHECK_INTERVAL > 0:
+            _monitor = asyncio.run_coroutine_threadsafe(evaluator.keep_resident(), loop)
+    return warm
+
+def health_check():
+    loop, evaluator = get_evaluator()
+    return asyncio.run_coroutine_threadsafe(evaluator.health_check(), loop).result()
+
 # --- Score & Observation Extraction ---
+@metrics.timed("parse")
 def extract_score_and_observation(text):
     # Match formats like "Score: 85", "score is 90", "score of 75"
     score_match = re.search(r"score(?:[:\s]*| is | of )(\d{1,3})", text, re.IGNORECASE)
@@ -42,6 +416,36 @@ def extract_score_and_observation(text):
         "observation": observation
     }
 
+# --- Structured Reply Parsing ---
+SCORE_PATTERN = re.compile(r'"score"\s*:\s*(\d{1,3})\D')
+EXPLANATION_PATTERN = re.compile(r'"explanation"\s*:\s*"((?:[^"\\]|\\.)*)')
+
+def early_score(partial):
+    # Score from a partial JSON reply, once its digits are followed by something else
+    match = SCORE_PATTERN.search(partial)
+    return min(int(match.group(1)), 100) if match else None
+
+@metrics.timed("parse")
+def parse_structured(text):
+    try:
+        data = json.loads(text)
+        return {"score": min(max(int(data["score"]), 0), 100), "observation": str(data.get("explanation", "")).strip()}
+    except (ValueError, KeyError, TypeError):
+        pass
+    # Cut off by the token budget: salvage what was generated, then the free-text parser
+    metrics.inc("llm_parse_fallbacks_total")
+    score = early_score(text + " ")
+    if score is None:
+        return extract_score_and_observation.__wrapped__(text)  # already inside this parse span
+    match = EXPLANATION_PATTERN.search(text)
+    observation = ""
+    if match:
+        try:
+            observation = json.loads(f'"{match.group(1)}"')
+        except ValueError:
+            observation = match.group(1)
+    return {"score": score, "observation": observation.strip()}
+
 # --- Main ---
 if __name__ == "__main__":
     question = "Tell me about a time you disagreed with your boss / Supervisor."
@@ -0,0 +1,112 @@
+import base64
+import io
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import metrics
+
+# Charts and wordclouds render here, off the request thread
+_render_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="render")
+
+def _figure(**kwargs):
+    # Bare Agg figure: no pyplot global state, freed as soon as it goes out of scope
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    fig = Figure(**kwargs)
+    FigureCanvasAgg(fig)
+    return fig
+
+def _png_html(fig, style, **savefig_kwargs):
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', **savefig_kwargs)
+    fig.clear()
+    img_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
+    return f'<img src="data:image/png;base64,{img_base64}" style="{style}">'
+
+# --- Score Breakdown Pie Charts ---
+@lru_cache(maxsize=128)
+def render_score_chart(sentiment, relevance):
+    # Create pie chart visualization with black background and white text
+    fig = _figure(figsize=(8, 4), facecolor='black')
+    ax1, ax2 = fig.subplots(1, 2)
+
+    # Sentiment pie chart
+    ax1.pie([sentiment, 10 - sentiment], labels=[f"{sentiment}/10", "Missed"],
+            colors=['#f497a9', '#f2f2f2'], startangle=90, autopct='%1.0f%%',
+            shadow=True, explode=[0.05, 0], textprops={'fontsize': 9, 'color': 'white'})
+    ax1.set_title("Sentiment Score", fontsize=12, color='white')
+    ax1.set_facecolor('black')
+
+    # Relevance pie chart
+    ax2.pie([relevance, 10 - relevance], labels=[f"{relevance}/10", "Missed"],
+            colors=['#72d6c9', '#eeeeee'], startangle=90, autopct='%1.0f%%',
+            shadow=True, explode=[0.05, 0], textprops={'fontsize': 9, 'color': 'white'})
+    ax2.set_title("Relevance Score", fontsize=12, color='white')
+    ax2.set_facecolor('black')
+
+    fig.suptitle("Score Breakdown", fontsize=13, color='white')
+    fig.tight_layout()
+    return _png_html(fig, "max-width: 100%; height: auto;", facecolor='black')
+
+# --- Word Cloud ---
+@lru_cache(maxsize=256)
+def render_wordcloud(pos_items, neg_items):
+    # pos_items / neg_items are ((word, count), ...) tuples so they can be cache keys
+    if not pos_items and not neg_items:
+        return '<p>No words available for word cloud.</p>'
+    from wordcloud import WordCloud
+
+    # Create a figure with increased size (1.5x: 400x200 -> 600x300)
+    fig = _figure(figsize=(6, 3), facecolor='black')
+    ax = fig.add_subplot()
+    for items, colormap in ((pos_items, 'Greens'), (neg_items, 'Reds')):
+        if not items:
+            continue
+        # Positive words in greenish shades, negative overlaid in reddish shades
+        cloud = WordCloud(
+            width=600, height=300,
+            background_color=None,  # Transparent background for overlay
+            mode="RGBA",
+            min_font_size=8, max_font_size=40,
+            colormap=colormap
+        ).generate_from_frequencies(dict(items))
+        ax.imshow(cloud, interpolation='bilinear')
+
+    ax.axis('off')
+    fig.tight_layout()
+    return _png_html(fig, "max-width: 600px; height: auto;", bbox_inches='tight', facecolor='black')
+
+# --- Tables ---
+@lru_cache(maxsize=256)
+def render_score_table(relevance, relevance_feedback, sentiment, sentiment_feedback):
+    import pandas as pd
+    score_table_data = [
+        {"Metric": "Relevance Score", "Value": f"{relevance}/10", "Feedback": relevance_feedback},
+        {"Metric": "Sentiment Score", "Value": f"{sentiment}/10", "Feedback": sentiment_feedback}
+    ]
+    return pd.DataFrame(score_table_data).to_html(index=False, classes="score-table", justify="left")
+
+@lru_cache(maxsize=256)
+def render_word_table(pos_items, neg_items):
+    # Create word table without row coloring
+    import pandas as pd
+    pos_df = pd.DataFrame(list(pos_items), columns=["word", "count"])
+    neg_df = pd.DataFrame(list(neg_items), columns=["word", "count"])
+    pos_df["Type"] = "Positive"
+    neg_df["Type"] = "Negative"
+    combined_df = pd.concat([pos_df, neg_df], ignore_index=True)[["Type", "word", "count"]]
+    return combined_df.to_html(index=False, classes="word-table", justify="center")
+
+def _word_items(words):
+    return tuple((item["word"], item["count"]) for item in words)
+
+@metrics.timed("render")
+def render_report(sentiment, relevance, relevance_feedback, sentiment_feedback, sentiment_data):
+    # Returns (chart_html, score_table_html, word_table_html, wordcloud_html)
+    pos_items = _word_items(sentiment_data.get("top_positive_contributing_words", []))
+    neg_items = _word_items(sentiment_data.get("top_negative_contributing_words", []))
+    chart = _render_pool.submit(render_score_chart, sentiment, relevance)
+    cloud = _render_pool.submit(render_wordcloud, pos_items, neg_items)
+    score_table_html = render_score_table(relevance, relevance_feedback, sentiment, sentiment_feedback)
+    word_table_html = render_word_table(pos_items, neg_items)
+    return chart.result(), score_table_html, word_table_html, cloud.result()
@@ -1,8 +1,27 @@
 import subprocess
+import hashlib
 import json
 import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-def extract_audio_with_ffmpeg(video_path, audio_path="/home/ubuntu/output.wav"):
+import audio
+import metrics
+import whisper_server
+from cache import CACHE_DIR, DiskCache, cache_key
+
+WHISPER_CLI_BIN = "../../whisper.cpp/./build/bin/whisper-cli"
+# Keep the model loaded in a long-lived whisper-server unless WHISPER_SERVER=0
+USE_WHISPER_SERVER = os.environ.get("WHISPER_SERVER", "1") != "0"
+BYTES_PER_SECOND = audio.SAMPLE_RATE * 2  # 16 kHz mono s16le
+# Number of chunks of one answer transcribed at the same time
+TRANSCRIBE_WORKERS = int(os.environ.get("WHISPER_WORKERS", "2"))
+TRANSCRIPT_CACHE_MB = int(os.environ.get("TRANSCRIPT_CACHE_MB", "256"))
+# Cut long pauses out before whisper sees the audio unless WHISPER_VAD=0
+VAD_ENABLED = os.environ.get("WHISPER_VAD", "1") != "0"
+
+def extract_audio_with_ffmpeg(video_path, audio_path="output.wav"):
     print(f"[INFO] Extracting audio from {video_path} to {audio_path}...")
     command = [
         "ffmpeg",
@@ -14,12 +33,77 @@ def extract_audio_with_ffmpeg(video_path, audio_path="/home/ubuntu/output.wav"):
         audio_path,
         "-y"
     ]
-    subprocess.run(command, check=True)
+    with metrics.span("ffmpeg"):
+        subprocess.run(command, check=True)
     return audio_path
 
+def stream_audio_with_ffmpeg(video_path, chunk_seconds=1):
+    # Yield raw 16 kHz mono s16le PCM from an ffmpeg pipe in fixed-size chunks
+    print(f"[INFO] Streaming audio from {video_path}...")
+    command = [
+        "ffmpeg",
+        "-loglevel", "error",
+        "-i", video_path,
+        "-vn",
+        "-f", "s16le",
+        "-acodec", "pcm_s16le",
+        "-ar", "16000",
+        "-ac", "1",
+        "pipe:1"
+    ]
+    chunk_bytes = int(chunk_seconds * BYTES_PER_SECOND)
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    try:
+        while True:
+            chunk = process.stdout.read(chunk_bytes)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command)
+
+def shift_segments(segments, offset_ms, offset_map=None):
+    # offset_map takes times in trimmed audio back to where they were before the pauses were cut
+    shifted = []
+    for segment in segments:
+        start, end = segment["offsets"]["from"], segment["offsets"]["to"]
+        if offset_map is not None:
+            start, end = offset_map.to_original(start), offset_map.to_original(end, end=True)
+        start += offset_ms
+        end += offset_ms
+        shifted.append({
+            "timestamps": {"from": whisper_server.format_timestamp(start), "to": whisper_server.format_timestamp(end)},
+            "offsets": {"from": start, "to": end},
+            "text": segment["text"]
+        })
+    return shifted
+
+def save_transcription(data, output_json):
+    with open(output_json, "w") as f:
+        json.dump(data, f, indent=2)
+    with open(output_json.replace(".json", ".txt"), "w") as f:
+        for segment in data["transcription"]:
+            f.write(segment["text"] + "\n")
+
+def transcribe_with_whisper_server(audio_path, model_path, output_json):
+    print(f"[INFO] Sending {audio_path} to whisper-server...")
+    with open(audio_path, "rb") as f:
+        wav_bytes = f.read()
+    data = whisper_server.get_service(model_path, workers=TRANSCRIBE_WORKERS).transcribe(wav_bytes)
+    save_transcription(data, output_json)
+    return data
+
 def transcribe_with_whisper_cpp(audio_path, model_path="models/ggml-base.en.bin", output_json="whisper_transcription.json"):
+    if can_stream_audio():
+        return transcribe_with_whisper_server(audio_path, model_path, output_json)
+    return _run_whisper_cli(audio_path, model_path, output_json)
+
+def _run_whisper_cli(audio_path, model_path, output_json, threads=None):
     command = [
-        "../../whisper.cpp/./build/bin/whisper-cli",
+        WHISPER_CLI_BIN,
         "-f", audio_path,
         "-m", model_path,
         "-otxt",  # output plain .txt
@@ -27,9 +111,12 @@ def transcribe_with_whisper_cpp(audio_path, model_path="models/ggml-base.en.bin"
         "-ml", "100",
         "-of", output_json.replace(".json", "")
     ]
+    if threads:
+        command += ["-t", str(threads)]
 
     print(f"[INFO] Running whisper.cpp transcription on {audio_path}...")
-    subprocess.run(command, check=True)
+    with metrics.span("whisper"):
+        subprocess.run(command, check=True)
 
     if os.path.exists(output_json):
         with open(output_json, "r") as f:
@@ -38,6 +125,148 @@ def transcribe_with_whisper_cpp(audio_path, model_path="models/ggml-base.en.bin"
     else:
         raise FileNotFoundError(f"Failed to find {output_json}")
 
+def _transcribe_pcm_cli(pcm, model_path):
+    with tempfile.TemporaryDirectory() as tmp:
+        wav_path = os.path.join(tmp, "chunk.wav")
+        audio.write_wav(wav_path, pcm)
+        return _run_whisper_cli(wav_path, model_path, os.path.join(tmp, "chunk.json"))
+
+_cli_pool = ThreadPoolExecutor(max_workers=TRANSCRIBE_WORKERS, thread_name_prefix="whisper-cli")
+
+def submit_pcm_transcription(pcm, model_path="models/ggml-base.en.bin"):
+    # Future with the transcription of a raw 16 kHz mono s16le buffer
+    if can_stream_audio():
+        return whisper_server.get_service(model_path, workers=TRANSCRIBE_WORKERS).submit_pcm(pcm)
+    return _cli_pool.submit(_transcribe_pcm_cli, pcm, model_path)
+
+def trim_pcm(pcm):
+    # Drop non-speech from a 16 kHz s16le buffer; returns (pcm, offset_map), pcm is empty if nothing was said
+    if not VAD_ENABLED:
+        return pcm, None
+    samples, offset_map = audio.remove_silence(audio.pcm_to_samples(pcm))
+    if offset_map is None and len(samples):
+        return pcm, None
+    metrics.inc("vad_trimmed_seconds_total", (len(pcm) // 2 - len(samples)) / audio.SAMPLE_RATE)
+    return samples.tobytes(), offset_map
+
+def cut_silence_chunks(buffer, chunk_seconds=30, search_seconds=5):
+    # Cut every full chunk off the front of a PCM bytearray, each ending in the pause nearest chunk_seconds
+    chunks = []
+    limit = int((chunk_seconds + search_seconds) * BYTES_PER_SECOND)
+    lo = int((chunk_seconds - search_seconds) * audio.SAMPLE_RATE)
+    hi = int((chunk_seconds + search_seconds) * audio.SAMPLE_RATE)
+    while len(buffer) >= limit:
+        samples = audio.pcm_to_samples(buffer)
+        cut = audio.quietest_point(samples, lo, hi) * 2
+        del samples  # release the view so the buffer can shrink
+        chunks.append(bytes(buffer[:cut]))
+        del buffer[:cut]
+    return chunks
+
+def iter_silence_chunks(pcm_stream, chunk_seconds=30, search_seconds=5):
+    # Re-cut an incoming PCM stream in pauses near every chunk_seconds; yields (offset_bytes, pcm)
+    buffer = bytearray()
+    offset = 0
+    for piece in pcm_stream:
+        buffer += piece
+        for chunk in cut_silence_chunks(buffer, chunk_seconds, search_seconds):
+            yield offset, chunk
+            offset += len(chunk)
+    if buffer:
+        yield offset, bytes(buffer)
+
+def merge_transcriptions(parts):
+    # parts: (offset_ms, transcription dict, offset_map or None) in audio order
+    segments = []
+    for offset_ms, data, offset_map in parts:
+        segments.extend(shift_segments(data["transcription"], offset_ms, offset_map))
+    return {"transcription": segments}
+
+def transcribe_video_stream(video_path, model_path="models/ggml-base.en.bin", output_json="whisper_transcription.json",
+                            chunk_seconds=30, workers=TRANSCRIBE_WORKERS):
+    # Each chunk goes to the whisper-server pool as soon as ffmpeg has produced it, no WAV on disk
+    service = whisper_server.get_service(model_path, workers=workers)
+    pending = []
+    for offset_bytes, chunk in iter_silence_chunks(stream_audio_with_ffmpeg(video_path), chunk_seconds):
+        speech, offset_map = trim_pcm(chunk)
+        if not speech:
+            continue  # nothing but silence, no need to wake whisper
+        pending.append((offset_bytes * 1000 // BYTES_PER_SECOND, service.submit_pcm(speech), offset_map))
+
+    data = merge_transcriptions([(offset_ms, future.result(), offset_map) for offset_ms, future, offset_map in pending])
+    save_transcription(data, output_json)
+    return data
+
+def transcribe_chunked(audio_path, model_path="models/ggml-base.en.bin", output_json="whisper_transcription.json",
+                       chunk_seconds=30, workers=TRANSCRIBE_WORKERS):
+    # Cut out the pauses, split the rest of the WAV at the shorter ones and transcribe the pieces concurrently
+    pcm, offset_map = trim_pcm(audio.read_wav_pcm(audio_path))
+    if not pcm:
+        data = {"transcription": []}
+        save_transcription(data, output_json)
+        return data
+    base = output_json.replace(".json", "")
+    bounds = audio.split_at_silence(audio.pcm_to_samples(pcm), chunk_seconds)
+    if len(bounds) == 1:
+        if offset_map is None:
+            return transcribe_with_whisper_cpp(audio_path, model_path, output_json)
+        speech_path = f"{base}_speech.wav"
+        audio.write_wav(speech_path, pcm)
+        data = transcribe_with_whisper_cpp(speech_path, model_path, output_json)
+        data = merge_transcriptions([(0, data, offset_map)])
+        save_transcription(data, output_json)
+        return data
+
+    print(f"[INFO] Transcribing {audio_path} in {len(bounds)} chunks with {workers} workers...")
+    threads = max(1, (os.cpu_count() or 4) // workers)
+
+    def transcribe_part(i, start, end):
+        part_path = f"{base}_part{i}.wav"
+        audio.write_wav(part_path, memoryview(pcm)[start * 2:end * 2])
+        if can_stream_audio():
+            return transcribe_with_whisper_server(part_path, model_path, f"{base}_part{i}.json")
+        return _run_whisper_cli(part_path, model_path, f"{base}_part{i}.json", threads)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(transcribe_part, i, start, end) for i, (start, end) in enumerate(bounds)]
+        data = merge_transcriptions([
+            (start * 1000 // audio.SAMPLE_RATE, future.result(), None)
+            for (start, _), future in zip(bounds, futures)
+        ])
+    if offset_map is not None:
+        data = merge_transcriptions([(0, data, offset_map)])
+    save_transcription(data, output_json)
+    return data
+
+# --- Transcript Cache Keyed by Media Content ---
+_transcript_cache = None
+_cache_lock = threading.Lock()
+
+def get_transcript_cache():
+    global _transcript_cache
+    with _cache_lock:
+        if _transcript_cache is None:
+            _transcript_cache = DiskCache(
+                os.path.join(CACHE_DIR, "transcripts.sqlite"),
+                max_entries=None, max_bytes=TRANSCRIPT_CACHE_MB * 1024 * 1024
+            )
+            metrics.register_cache("transcript", _transcript_cache.stats)
+        return _transcript_cache
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def transcript_key(video_path, model_path):
+    # Same clip + same model gives the same transcript, whatever the file is called
+    return cache_key(file_sha256(video_path), os.path.abspath(model_path), VAD_ENABLED)
+
+def can_stream_audio():
+    return USE_WHISPER_SERVER and os.path.exists(whisper_server.WHISPER_SERVER_BIN)
+
 # === Main ===
 if __name__ == "__main__":
     video_path = "../video/sample.mp4"
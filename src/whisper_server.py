@@ -0,0 +1,208 @@
+import atexit
+import json
+import os
+import queue
+import socket
+import struct
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import Future
+
+import metrics
+
+WHISPER_SERVER_BIN = "../../whisper.cpp/./build/bin/whisper-server"
+SAMPLE_RATE = 16000
+
+# --- Response Conversion ---
+def format_timestamp(ms):
+    hours, rest = divmod(int(ms), 3600000)
+    mins, rest = divmod(rest, 60000)
+    secs, millis = divmod(rest, 1000)
+    return f"{hours:02d}:{mins:02d}:{secs:02d},{millis:03d}"
+
+def to_transcription(response):
+    # Reshape whisper-server's verbose_json into the whisper-cli -oj layout
+    segments = []
+    for segment in response.get("segments", []):
+        start = int(round(segment["start"] * 1000))
+        end = int(round(segment["end"] * 1000))
+        segments.append({
+            "timestamps": {"from": format_timestamp(start), "to": format_timestamp(end)},
+            "offsets": {"from": start, "to": end},
+            "text": segment["text"]
+        })
+    return {"transcription": segments}
+
+def wav_header(num_bytes, sample_rate=SAMPLE_RATE):
+    # 44-byte RIFF header for mono s16le PCM, so raw buffers can be sent as WAV
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + num_bytes, b"WAVE",
+        b"fmt ", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16,
+        b"data", num_bytes
+    )
+
+def _encode_multipart(fields, file_field, filename, payload):
+    # payload is a list of buffers, joined once into the request body
+    boundary = uuid.uuid4().hex
+    head = []
+    for name, value in fields.items():
+        head.append(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n")
+    head.append(
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"{file_field}\"; filename=\"{filename}\"\r\n"
+        "Content-Type: audio/wav\r\n\r\n"
+    )
+    body = b"".join([
+        "".join(head).encode("utf-8"),
+        *payload,
+        f"\r\n--{boundary}--\r\n".encode("utf-8")
+    ])
+    return body, f"multipart/form-data; boundary={boundary}"
+
+def _free_port(host):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+# --- Single whisper-server Process ---
+class WhisperServer:
+    def __init__(self, model_path, host="127.0.0.1", port=None, threads=4,
+                 binary=WHISPER_SERVER_BIN, startup_timeout=120):
+        self.model_path = model_path
+        self.host = host
+        self.port = port
+        self.threads = threads
+        self.binary = binary
+        self.startup_timeout = startup_timeout
+        self.process = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        if self.is_running():
+            return
+        if self.port is None:
+            self.port = _free_port(self.host)
+        command = [
+            self.binary,
+            "-m", self.model_path,
+            "-t", str(self.threads),
+            "-ml", "100",
+            "--host", self.host,
+            "--port", str(self.port)
+        ]
+        print(f"[INFO] Starting whisper-server on {self.url} with {self.model_path}...")
+        self.process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self._wait_until_ready()
+
+    def _wait_until_ready(self):
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"whisper-server exited with code {self.process.returncode}")
+            try:
+                urllib.request.urlopen(self.url, timeout=1).close()
+                return
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.2)
+        self.stop()
+        raise TimeoutError(f"whisper-server did not become ready within {self.startup_timeout}s")
+
+    def stop(self):
+        if self.is_running():
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+
+    def transcribe(self, wav, timeout=600):
+        # wav is either the whole file or a list of buffers (header, pcm...)
+        if not self.is_running():
+            self.start()
+        payload = [wav] if isinstance(wav, (bytes, bytearray, memoryview)) else list(wav)
+        body, content_type = _encode_multipart(
+            {"response_format": "verbose_json", "temperature": "0.0"},
+            "file", "audio.wav", payload
+        )
+        request = urllib.request.Request(
+            f"{self.url}/inference", data=body, headers={"Content-Type": content_type}
+        )
+        with metrics.span("whisper"), urllib.request.urlopen(request, timeout=timeout) as response:
+            data = json.loads(response.read().decode("utf-8"))
+        if "error" in data:
+            raise RuntimeError(f"whisper-server error: {data['error']}")
+        return to_transcription(data)
+
+# --- Queue in Front of the Server Pool ---
+class TranscriptionService:
+    def __init__(self, model_path, workers=1, threads=4, binary=WHISPER_SERVER_BIN):
+        self.jobs = queue.Queue()
+        self.servers = [WhisperServer(model_path, threads=threads, binary=binary) for _ in range(workers)]
+        self.threads = []
+        for server in self.servers:
+            server.start()
+            thread = threading.Thread(target=self._worker, args=(server,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _worker(self, server):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            wav, future, queued_at = job
+            metrics.observe("queue_wait_seconds", time.perf_counter() - queued_at, queue="whisper")
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(server.transcribe(wav))
+            except Exception as e:
+                future.set_exception(e)
+
+    def submit(self, wav):
+        future = Future()
+        self.jobs.put((wav, future, time.perf_counter()))
+        return future
+
+    def submit_pcm(self, pcm):
+        # Raw 16 kHz mono s16le; the PCM is only copied once, into the request body
+        return self.submit([wav_header(len(pcm)), pcm])
+
+    def transcribe(self, wav):
+        return self.submit(wav).result()
+
+    def shutdown(self):
+        for _ in self.threads:
+            self.jobs.put(None)
+        for server in self.servers:
+            server.stop()
+
+_services = {}
+_services_lock = threading.Lock()
+
+def get_service(model_path, workers=1, binary=WHISPER_SERVER_BIN):
+    # One long-lived service per model, so the weights are loaded at startup rather than per request.
+    # Each of its server processes holds its own copy of the model; the CPU cores are shared out between them
+    with _services_lock:
+        service = _services.get(model_path)
+        if service is None:
+            threads = max(1, (os.cpu_count() or 4) // workers)
+            service = TranscriptionService(model_path, workers=workers, threads=threads, binary=binary)
+            _services[model_path] = service
+        return service
+
+@atexit.register
+def _shutdown_services():
+    for service in _services.values():
+        service.shutdown()